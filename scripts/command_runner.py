@@ -0,0 +1,163 @@
+import collections
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+DEFAULT_TAIL_LINES = 50
+READ_CHUNK_SIZE = 64 * 1024
+# time to wait for the output pipe to be closed after the process has exited,
+# some tools (e.g. Gradle daemons) may keep it open in the background processes
+PIPE_DRAIN_TIMEOUT = 5
+
+
+class CommandResult:
+    def __init__(self, args: list[str], returncode: int, tail: list[str], timed_out: bool, duration: float):
+        self.args = args
+        self.returncode = returncode
+        self.tail = tail
+        self.timed_out = timed_out
+        self.duration = duration
+
+    @property
+    def output(self) -> str:
+        """
+        Last lines of the combined stdout and stderr of the command
+        """
+        return '\n'.join(self.tail)
+
+    def __str__(self):
+        status = 'timed out' if self.timed_out else f'exit code {self.returncode}'
+        return f'{" ".join(self.args)} ({status}, {self.duration:.1f}s)'
+
+
+class _OutputTail:
+    """
+    Keeps only the last `max_lines` complete lines of a byte stream.
+    """
+
+    def __init__(self, max_lines: int):
+        self.lines = collections.deque(maxlen=max_lines)
+        self.partial = b''
+
+    def feed(self, chunk: bytes) -> None:
+        *lines, self.partial = (self.partial + chunk).split(b'\n')
+        self.lines.extend(lines[-self.lines.maxlen:] if self.lines.maxlen else lines)
+        # a single line without newlines should not grow unbounded either
+        self.partial = self.partial[-READ_CHUNK_SIZE:]
+
+    def get(self) -> list[str]:
+        lines = list(self.lines)
+        if self.partial:
+            lines.append(self.partial)
+        return [line.decode('utf-8', errors='replace').rstrip('\r') for line in lines]
+
+
+class _Reader(threading.Thread):
+    """
+    Copies the output of a process into the tail and the log file until the pipe is closed.
+    Nothing is written after `detach`, so the log file can be closed while the pipe is still held open
+    by the background processes of the command.
+    """
+
+    def __init__(self, stream, tail: _OutputTail, log_file):
+        super().__init__(daemon=True)
+        self.stream = stream
+        self.tail = tail
+        self.log_file = log_file
+        self.lock = threading.Lock()
+        self.detached = False
+
+    def run(self) -> None:
+        with self.stream:
+            while True:
+                chunk = self.stream.read1(READ_CHUNK_SIZE)
+                if not chunk:
+                    break
+                with self.lock:
+                    if self.detached:
+                        continue
+                    self.tail.feed(chunk)
+                    if self.log_file is not None:
+                        self.log_file.write(chunk)
+                        self.log_file.flush()
+
+    def detach(self) -> None:
+        with self.lock:
+            self.detached = True
+
+
+def _kill(process: subprocess.Popen) -> None:
+    try:
+        if sys.platform.startswith('win'):
+            process.kill()
+        else:
+            # the command runs in its own session, so the whole process tree is killed
+            os.killpg(process.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def run_command(
+        args: list[str],
+        cwd: str = None,
+        env: dict = None,
+        log_path: str = None,
+        timeout: float = None,
+        tail_lines: int = DEFAULT_TAIL_LINES
+) -> CommandResult:
+    """
+    Runs a command, streaming its combined stdout and stderr into `log_path` (appending to it),
+    while keeping only the last `tail_lines` lines of the output in memory for error reporting.
+    The command, together with all its child processes, is killed if it does not finish in `timeout` seconds.
+
+    :raises FileNotFoundError: if the executable is not found.
+    """
+    tail = _OutputTail(tail_lines)
+    log_file = None
+    if log_path is not None:
+        os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+        log_file = open(log_path, 'ab')
+
+    try:
+        if log_file is not None:
+            log_file.write(f'$ {" ".join(args)}\n'.encode('utf-8'))
+            log_file.flush()
+
+        start = time.monotonic()
+        process = subprocess.Popen(
+            args,
+            cwd=cwd,
+            env=env,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            start_new_session=not sys.platform.startswith('win'),
+        )
+        reader = _Reader(process.stdout, tail, log_file)
+        reader.start()
+
+        # the exit of the process is awaited separately from the pipe,
+        # so the background processes holding the pipe open do not count against the timeout
+        timed_out = False
+        try:
+            process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            timed_out = True
+            _kill(process)
+            process.wait()
+
+        reader.join(PIPE_DRAIN_TIMEOUT)
+        reader.detach()
+        duration = time.monotonic() - start
+
+        if log_file is not None:
+            status = f'timed out after {timeout}s' if timed_out else f'exit code {process.returncode}'
+            log_file.write(f'$ finished with {status} in {duration:.1f}s\n'.encode('utf-8'))
+    finally:
+        if log_file is not None:
+            log_file.close()
+
+    return CommandResult(args, process.returncode, tail.get(), timed_out, duration)
@@ -0,0 +1,346 @@
+#!/bin/python3
+import argparse
+import csv
+import itertools
+import os
+import sys
+import warnings
+
+import numpy as np
+
+# columns of the per-iteration CSVs of analysis `Main.kt`, which are written without a header
+ANALYSIS_COLUMNS = {
+    'tool': 0,
+    'run_name': 1,
+    'iteration': 2,
+    'build_id': 3,
+}
+# (name, column in the analysis CSVs, column name in the CSVs of `csvify.kt`), all the values are percents
+METRICS = [
+    ('compilation rate', 7, 'compilation rate'),
+    ('line coverage', 10, 'line coverage'),
+    ('branch coverage', 13, 'branch coverage'),
+    ('mutation score', 16, 'mutation score'),
+]
+CSVIFY_HEADER_PREFIX = 'tool,runName,iteration,benchmark buildId'
+DEFAULT_RESAMPLES = 2000
+DEFAULT_PERMUTATIONS = 10000
+
+
+class Results:
+    """
+    Metric values of all the configurations (tool and run name), runs and benchmarks in a single array
+    of shape (configurations, runs, benchmarks, metrics); missing values are NaN.
+    """
+
+    def __init__(self, configurations: list[str], build_ids: list[str], values: np.ndarray):
+        self.configurations = configurations
+        self.build_ids = build_ids
+        self.values = values
+
+    def benchmark_means(self) -> np.ndarray:
+        """
+        :return: Mean over the runs, of shape (configurations, benchmarks, metrics).
+        """
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            return np.nanmean(self.values, axis=1)
+
+
+def find_csv_files(paths: list[str]) -> list[str]:
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if name.endswith('.csv'))
+        else:
+            files.append(path)
+    return files
+
+
+def parse_value(value: str) -> float:
+    # compilation rate and the coverages are NaN if there is nothing to compile or cover, `csvify.kt` counts them as 0
+    value = float(value)
+    return 0.0 if np.isnan(value) else value
+
+
+def read_rows(path: str) -> list[tuple[str, str, int, str, list[float]]]:
+    """
+    Reads either a per-iteration CSV of analysis `Main.kt` (", "-separated, without a header)
+    or a CSV of `csvify.kt` (with a header).
+
+    :return: (tool, run name, iteration, build id, metric values) for each row.
+    """
+    with open(path) as file:
+        lines = file.read().splitlines()
+    if not lines:
+        return []
+
+    if lines[0].startswith(CSVIFY_HEADER_PREFIX):
+        reader = csv.reader(lines)
+        header = next(reader)
+        metric_columns = [header.index(column) for _, _, column in METRICS]
+        return [
+            (row[0], row[1], int(row[2]), row[3], [parse_value(row[column]) for column in metric_columns])
+            for row in reader if row
+        ]
+
+    rows = []
+    for line in lines:
+        fields = line.split(', ')
+        rows.append((
+            fields[ANALYSIS_COLUMNS['tool']],
+            fields[ANALYSIS_COLUMNS['run_name']],
+            int(fields[ANALYSIS_COLUMNS['iteration']]),
+            fields[ANALYSIS_COLUMNS['build_id']],
+            [parse_value(fields[column]) for _, column, _ in METRICS],
+        ))
+    return rows
+
+
+def load_results(files: list[str]) -> Results:
+    """
+    Loads all the CSV files in one pass. Runs of each configuration are numbered densely in the order of
+    their iteration ids, so configurations with a different number of runs are padded with NaN.
+    """
+    rows = [row for path in files for row in read_rows(path)]
+    configurations = sorted({f'{tool}/{run_name}' for tool, run_name, _, _, _ in rows})
+    build_ids = sorted({build_id for _, _, _, build_id, _ in rows})
+    iterations = {configuration: set() for configuration in configurations}
+    for tool, run_name, iteration, _, _ in rows:
+        iterations[f'{tool}/{run_name}'].add(iteration)
+
+    configuration_index = {configuration: index for index, configuration in enumerate(configurations)}
+    build_id_index = {build_id: index for index, build_id in enumerate(build_ids)}
+    run_index = {
+        configuration: {iteration: index for index, iteration in enumerate(sorted(configuration_iterations))}
+        for configuration, configuration_iterations in iterations.items()
+    }
+    runs = max((len(configuration_iterations) for configuration_iterations in iterations.values()), default=0)
+
+    values = np.full((len(configurations), runs, len(build_ids), len(METRICS)), np.nan)
+    if rows:
+        configuration = [f'{tool}/{run_name}' for tool, run_name, _, _, _ in rows]
+        values[
+            [configuration_index[name] for name in configuration],
+            [run_index[name][row[2]] for name, row in zip(configuration, rows)],
+            [build_id_index[row[3]] for row in rows],
+        ] = np.array([row[4] for row in rows])
+    return Results(configurations, build_ids, values)
+
+
+def bootstrap_means(samples: np.ndarray, resamples: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Bootstrap distribution of the mean over the first axis of `samples`, ignoring NaN.
+    Each resample is represented by the multiplicities of the samples, so all the resamples of all the columns
+    are computed by a single matrix product instead of materializing the resampled arrays.
+
+    :return: Array of shape (resamples, *samples.shape[1:]).
+    """
+    n = samples.shape[0]
+    flat = samples.reshape(n, -1)
+    valid = ~np.isnan(flat)
+    counts = rng.multinomial(n, np.full(n, 1 / n), size=resamples).astype(float)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        means = (counts @ np.where(valid, flat, 0.0)) / (counts @ valid)
+    return means.reshape(resamples, *samples.shape[1:])
+
+
+def confidence_interval(distribution: np.ndarray, confidence: float) -> tuple[np.ndarray, np.ndarray]:
+    alpha = (1 - confidence) / 2
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        low, high = np.nanquantile(distribution, [alpha, 1 - alpha], axis=0)
+    return low, high
+
+
+def summarize_configurations(results: Results, resamples: int, confidence: float, rng: np.random.Generator) -> list:
+    """
+    Mean and median over the benchmarks of the per-benchmark means of each configuration,
+    with a bootstrap confidence interval of the mean over the benchmarks.
+    """
+    means = results.benchmark_means()
+    rows = []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        for index, configuration in enumerate(results.configurations):
+            low, high = confidence_interval(bootstrap_means(means[index], resamples, rng), confidence)
+            benchmarks = np.sum(~np.isnan(means[index]), axis=0)
+            runs = np.sum(np.any(~np.isnan(results.values[index]), axis=(1, 2)))
+            for metric, (name, _, _) in enumerate(METRICS):
+                rows.append([
+                    configuration, name, np.nanmean(means[index, :, metric]), np.nanmedian(means[index, :, metric]),
+                    low[metric], high[metric], int(benchmarks[metric]), int(runs),
+                ])
+    return rows
+
+
+def summarize_benchmarks(results: Results, resamples: int, confidence: float, rng: np.random.Generator) -> list:
+    """
+    Mean and median over the runs of each configuration on each benchmark,
+    with a bootstrap confidence interval of the mean over the runs.
+    """
+    rows = []
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', category=RuntimeWarning)
+        for index, configuration in enumerate(results.configurations):
+            values = results.values[index]
+            low, high = confidence_interval(bootstrap_means(values, resamples, rng), confidence)
+            means = np.nanmean(values, axis=0)
+            medians = np.nanmedian(values, axis=0)
+            runs = np.sum(~np.isnan(values), axis=0)
+            for benchmark, build_id in enumerate(results.build_ids):
+                for metric, (name, _, _) in enumerate(METRICS):
+                    if runs[benchmark, metric] == 0:
+                        continue
+                    rows.append([
+                        configuration, build_id, name, means[benchmark, metric], medians[benchmark, metric],
+                        low[benchmark, metric], high[benchmark, metric], int(runs[benchmark, metric]),
+                    ])
+    return rows
+
+
+def sign_flip_p_values(differences: np.ndarray, permutations: int, rng: np.random.Generator) -> np.ndarray:
+    """
+    Two-sided paired permutation test of zero mean difference for each column of `differences`
+    of shape (pairs, columns), NaN values are ignored: under the null hypothesis the sign of each paired
+    difference is arbitrary. The same sign flips are applied to all the columns.
+    """
+    valid = ~np.isnan(differences)
+    filled = np.where(valid, differences, 0.0)
+    count = valid.sum(axis=0)
+    signs = rng.choice([-1.0, 1.0], size=(permutations, differences.shape[0]))
+    with np.errstate(invalid='ignore', divide='ignore'):
+        observed = np.abs(filled.sum(axis=0)) / count
+        permuted = np.abs(signs @ filled) / count
+    # a small tolerance, so the permutations equal to the observed difference are not lost to rounding
+    extreme = np.sum(permuted >= observed - 1e-12, axis=0)
+    return (extreme + 1) / (permutations + 1)
+
+
+def vargha_delaney(a: np.ndarray, b: np.ndarray) -> float:
+    """
+    Probability that a value of `a` is larger than a value of `b`, ties count as half.
+    """
+    greater = np.sum(a[:, None] > b[None, :])
+    equal = np.sum(a[:, None] == b[None, :])
+    return (greater + 0.5 * equal) / (len(a) * len(b))
+
+
+def holm_correction(p_values: np.ndarray) -> np.ndarray:
+    order = np.argsort(p_values)
+    m = len(p_values)
+    adjusted = np.maximum.accumulate((m - np.arange(m)) * p_values[order])
+    result = np.empty(m)
+    result[order] = np.minimum(adjusted, 1.0)
+    return result
+
+
+def compare_configurations(
+        results: Results,
+        resamples: int,
+        permutations: int,
+        confidence: float,
+        rng: np.random.Generator
+) -> list:
+    """
+    Paired comparison of each pair of configurations on the benchmarks both of them have results for:
+    mean difference of the per-benchmark means with its bootstrap confidence interval, p-value of the paired
+    permutation test (Holm-corrected over all the pairs for each metric), wins/ties/losses over the benchmarks
+    and Vargha-Delaney A12 effect size.
+    """
+    means = results.benchmark_means()
+    rows = []
+    for first, second in itertools.combinations(range(len(results.configurations)), 2):
+        # NaN unless both configurations have results for the benchmark
+        differences = means[first] - means[second]
+        low, high = confidence_interval(bootstrap_means(differences, resamples, rng), confidence)
+        p_values = sign_flip_p_values(differences, permutations, rng)
+        for metric, (name, _, _) in enumerate(METRICS):
+            paired = ~np.isnan(differences[:, metric])
+            if not np.any(paired):
+                continue
+            metric_differences = differences[paired, metric]
+            rows.append([
+                results.configurations[first], results.configurations[second], name, int(np.sum(paired)),
+                metric_differences.mean(), low[metric], high[metric], p_values[metric], None,
+                int(np.sum(metric_differences > 0)), int(np.sum(metric_differences == 0)),
+                int(np.sum(metric_differences < 0)),
+                vargha_delaney(means[first, paired, metric], means[second, paired, metric]),
+            ])
+
+    for name, _, _ in METRICS:
+        metric_rows = [row for row in rows if row[2] == name]
+        if metric_rows:
+            adjusted = holm_correction(np.array([row[7] for row in metric_rows]))
+            for row, p_value in zip(metric_rows, adjusted):
+                row[8] = p_value
+    return rows
+
+
+CONFIGURATION_COLUMNS = ['configuration', 'metric', 'mean', 'median', 'ci low', 'ci high', 'benchmarks', 'runs']
+BENCHMARK_COLUMNS = ['configuration', 'benchmark', 'metric', 'mean', 'median', 'ci low', 'ci high', 'runs']
+COMPARISON_COLUMNS = ['first', 'second', 'metric', 'benchmarks', 'mean difference', 'ci low', 'ci high',
+                      'p-value', 'holm p-value', 'wins', 'ties', 'losses', 'A12']
+
+
+def format_cell(value) -> str:
+    if isinstance(value, (float, np.floating)):
+        return f'{value:.4g}' if abs(value) < 1e-2 and value != 0 else f'{value:.2f}'
+    return str(value)
+
+
+def write_csv(path: str, columns: list[str], rows: list) -> None:
+    with open(path, 'w', newline='') as file:
+        writer = csv.writer(file)
+        writer.writerow(columns)
+        writer.writerows([[format_cell(value) for value in row] for row in rows])
+
+
+def print_table(columns: list[str], rows: list) -> None:
+    cells = [columns] + [[format_cell(value) for value in row] for row in rows]
+    widths = [max(len(row[column]) for row in cells) for column in range(len(columns))]
+    for row in cells:
+        print('  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compares the tools by the coverage metrics of the analysis")
+    parser.add_argument("inputs", type=str, nargs='+',
+                        help="CSV files of the analysis or csvify, or folders with them")
+    parser.add_argument("--output", type=str,
+                        help="Folder to write configurations.csv, benchmarks.csv and comparisons.csv to")
+    parser.add_argument("--resamples", type=int, default=DEFAULT_RESAMPLES, help="Number of bootstrap resamples")
+    parser.add_argument("--permutations", type=int, default=DEFAULT_PERMUTATIONS,
+                        help="Number of permutations of the paired permutation test")
+    parser.add_argument("--confidence", type=float, default=0.95, help="Confidence level of the intervals")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the random generator")
+    args = parser.parse_args()
+
+    files = find_csv_files(args.inputs)
+    results = load_results(files)
+    if not results.configurations:
+        print('No results found', file=sys.stderr)
+        sys.exit(1)
+    print(f'Loaded {len(files)} files: {len(results.configurations)} configurations, '
+          f'up to {results.values.shape[1]} runs, {len(results.build_ids)} benchmarks')
+
+    rng = np.random.default_rng(args.seed)
+    configuration_rows = summarize_configurations(results, args.resamples, args.confidence, rng)
+    benchmark_rows = summarize_benchmarks(results, args.resamples, args.confidence, rng)
+    comparison_rows = compare_configurations(results, args.resamples, args.permutations, args.confidence, rng)
+
+    print()
+    print_table(CONFIGURATION_COLUMNS, configuration_rows)
+    if comparison_rows:
+        print()
+        print_table(COMPARISON_COLUMNS, comparison_rows)
+
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+        write_csv(os.path.join(args.output, 'configurations.csv'), CONFIGURATION_COLUMNS, configuration_rows)
+        write_csv(os.path.join(args.output, 'benchmarks.csv'), BENCHMARK_COLUMNS, benchmark_rows)
+        write_csv(os.path.join(args.output, 'comparisons.csv'), COMPARISON_COLUMNS, comparison_rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,202 @@
+import logging
+import logging.handlers
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from generate_compose import ComposeFile
+from worker_watchdog import Watchdog
+
+COMPOSE_FILE_NAME = 'docker-compose.yml'
+# size of a single log file of a service in MiB, and the number of rotated files kept besides the current one
+DEFAULT_LOG_SIZE = 10
+LOG_BACKUPS = 4
+STATUS_INTERVAL = 10
+SERVICE_LABEL = 'com.docker.compose.service'
+
+
+class ServiceLogs:
+    """
+    Follows the logs of all the services through a single `docker-compose logs` process
+    and writes the output of each service into its own rotated file.
+    """
+
+    def __init__(self, compose_path: str, services: list[str], log_dir: str, log_size: int):
+        self.compose_path = compose_path
+        # longer names first, so `runner-kex-1` does not take the lines of `runner-kex-12`
+        self.services = sorted(services, key=len, reverse=True)
+        self.log_dir = log_dir
+        self.log_size = log_size
+        self.loggers = {}
+        self.prefixes = {}
+        self.process = None
+        self.thread = None
+
+    def _get_logger(self, service: str) -> logging.Logger:
+        if service not in self.loggers:
+            logger = logging.getLogger(f'compose.{service}')
+            logger.propagate = False
+            handler = logging.handlers.RotatingFileHandler(
+                os.path.join(self.log_dir, f'{service}.log'),
+                maxBytes=self.log_size * 1024 * 1024,
+                backupCount=LOG_BACKUPS,
+            )
+            handler.setFormatter(logging.Formatter('%(message)s'))
+            logger.addHandler(handler)
+            logger.setLevel(logging.INFO)
+            self.loggers[service] = logger
+        return self.loggers[service]
+
+    def _get_service(self, prefix: str) -> str:
+        # prefix is the container name, e.g. `runner-kex-0-1` or `project_runner-kex-0_1` depending on the version
+        if prefix not in self.prefixes:
+            self.prefixes[prefix] = next((service for service in self.services if service in prefix), 'compose')
+        return self.prefixes[prefix]
+
+    def _follow(self) -> None:
+        for line in self.process.stdout:
+            prefix, separator, message = line.rstrip('\n').partition(' | ')
+            if not separator:
+                prefix, message = '', line.rstrip('\n')
+            self._get_logger(self._get_service(prefix.strip())).info(message)
+
+    def start(self) -> None:
+        self.process = subprocess.Popen(
+            ['docker-compose', '-f', self.compose_path, 'logs', '--follow', '--no-color'],
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            errors='replace',
+        )
+        self.thread = threading.Thread(target=self._follow, daemon=True)
+        self.thread.start()
+
+    def stop(self) -> None:
+        if self.process is None:
+            return
+        self.process.terminate()
+        self.process.wait()
+        self.thread.join()
+        for logger in self.loggers.values():
+            for handler in list(logger.handlers):
+                handler.close()
+                logger.removeHandler(handler)
+
+
+def get_service_states(compose_path: str) -> dict[str, tuple[str, int]]:
+    """
+    :return: Status and exit code of the container of each service, e.g. `('running', 0)` or `('exited', 1)`.
+    """
+    container_ids = subprocess.run(
+        ['docker-compose', '-f', compose_path, 'ps', '--all', '--quiet'],
+        capture_output=True, text=True,
+    ).stdout.split()
+    if not container_ids:
+        return {}
+    output = subprocess.run(
+        ['docker', 'inspect', '--format',
+         f'{{{{index .Config.Labels "{SERVICE_LABEL}"}}}} {{{{.State.Status}}}} {{{{.State.ExitCode}}}}',
+         *container_ids],
+        capture_output=True, text=True,
+    ).stdout
+    states = {}
+    for line in output.splitlines():
+        service, status, exit_code = line.split()
+        states[service] = (status, int(exit_code))
+    return states
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    return f'{seconds // 3600}h {seconds % 3600 // 60:02d}m {seconds % 60:02d}s'
+
+
+def get_tool_service(runner: str) -> str:
+    # services of a worker are named `runner-<tool>-<i>` and `tool-<tool>-<i>` by `generate_compose`
+    return 'tool-' + runner[len('runner-'):]
+
+
+def supervise(compose_path: str, runners: list[str], states: dict[str, tuple[str, int]], watchdog: Watchdog) -> None:
+    """
+    Restarts the running workers that are hung. The job a worker is hung on is skipped first, and the restarted
+    runner skips the jobs that already have a result folder, so it continues with the next unfinished job.
+    Workers that hang too often are stopped.
+    """
+    for runner in runners:
+        if states.get(runner, ('running', 0))[0] != 'running' or not watchdog.is_hung(runner):
+            continue
+        services = [runner, get_tool_service(runner)]
+        # the job is skipped before the restart, while the heartbeat still points to it
+        if watchdog.handle_hung(runner):
+            subprocess.run(['docker-compose', '-f', compose_path, 'restart', *services], capture_output=True)
+        else:
+            subprocess.run(['docker-compose', '-f', compose_path, 'stop', *services], capture_output=True)
+        watchdog.mark_started(runner)
+
+
+def run_compose(
+        compose_file: ComposeFile,
+        log_dir: str,
+        log_size: int = DEFAULT_LOG_SIZE,
+        watchdog: Watchdog = None
+) -> bool:
+    """
+    Starts the services detached and waits until all the runners have exited. Output of each service is written
+    into `<log_dir>/<service>.log`, rotated every `log_size` MiB, only a short status is printed to the console.
+    If `watchdog` is set, hung workers are restarted, see `supervise`.
+
+    :return: True if all the runners have exited successfully.
+    """
+    os.makedirs(log_dir, exist_ok=True)
+    for service in compose_file.services:
+        # the logs are kept in `log_dir`, so Docker keeps only the tail of them
+        service.log_options = {'max-size': f'{log_size}m', 'max-file': '1'}
+    compose_path = os.path.join(log_dir, COMPOSE_FILE_NAME)
+    with open(compose_path, 'w') as file:
+        file.write(str(compose_file))
+    print(f'Compose file is written to {compose_path}')
+
+    runners = [service.name for service in compose_file.services if service.name.startswith('runner-')]
+    logs = ServiceLogs(compose_path, [service.name for service in compose_file.services], log_dir, log_size)
+    start = time.time()
+    states = {}
+    try:
+        if subprocess.run(['docker-compose', '-f', compose_path, 'up', '--detach']).returncode != 0:
+            print('Could not start the services', file=sys.stderr)
+            return False
+        logs.start()
+        print(f'Started {len(compose_file.services)} services, logs are written to {log_dir}')
+        if watchdog is not None:
+            for runner in runners:
+                watchdog.mark_started(runner)
+
+        last_status = None
+        while True:
+            time.sleep(STATUS_INTERVAL)
+            states = get_service_states(compose_path)
+            if watchdog is not None:
+                supervise(compose_path, runners, states, watchdog)
+            running = sum(1 for runner in runners if states.get(runner, ('running', 0))[0] != 'exited')
+            failed = sum(1 for runner in runners if states.get(runner) is not None and
+                         states[runner][0] == 'exited' and states[runner][1] != 0)
+            status = f'{len(runners) - running}/{len(runners)} runners have finished, {failed} failed'
+            if status != last_status:
+                print(f'[{format_duration(time.time() - start)}] {status}', flush=True)
+                last_status = status
+            if running == 0:
+                break
+    except KeyboardInterrupt:
+        print('Interrupted, stopping all the services', file=sys.stderr)
+    finally:
+        subprocess.run(['docker-compose', '-f', compose_path, 'down'], capture_output=True)
+        logs.stop()
+
+    failed = [runner for runner in runners if states.get(runner, ('running', 0)) != ('exited', 0)]
+    print(f'{len(runners) - len(failed)} out of {len(runners)} runners have finished successfully '
+          f'in {format_duration(time.time() - start)}')
+    for runner in failed:
+        status, exit_code = states.get(runner, ('unknown', 0))
+        print(f'  {runner}: {status}, exit code {exit_code}, see {os.path.join(log_dir, runner + ".log")}')
+    return not failed
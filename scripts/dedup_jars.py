@@ -0,0 +1,149 @@
+#!/bin/python3
+import argparse
+import errno
+import hashlib
+import json
+import logging
+import os
+import shutil
+import stat
+from concurrent.futures import ThreadPoolExecutor
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+
+class DedupStats:
+    def __init__(self):
+        self.jars = 0
+        self.unique_jars = 0
+        self.linked_jars = 0
+        self.rewritten_jars = 0
+        self.saved_bytes = 0
+
+    def __str__(self):
+        return (f'{self.jars} jars, {self.unique_jars} unique, '
+                f'{self.linked_jars} hard-linked, {self.rewritten_jars} moved to the store, '
+                f'{self.saved_bytes / (1024 * 1024):.1f} MiB saved')
+
+
+def file_hash(path: str) -> str:
+    sha = hashlib.sha256()
+    with open(path, 'rb') as file:
+        while chunk := file.read(HASH_CHUNK_SIZE):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def store_path(store_dir: str, digest: str, path: str) -> str:
+    # original file name is kept, so rewritten class path entries are still readable
+    return os.path.join(store_dir, digest[:2], digest, os.path.basename(path))
+
+
+def make_read_only(path: str) -> None:
+    # the projects share the inode of a stored jar, so a jar rewritten in place would corrupt all of them
+    os.chmod(path, stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH)
+
+
+def link_to_store(path: str, stored: str) -> bool:
+    """
+    Atomically replaces `path` with a hard link to `stored`.
+
+    :return: False if `path` and `stored` are on different file systems.
+    """
+    tmp_path = f'{path}.dedup'
+    if os.path.lexists(tmp_path):
+        os.remove(tmp_path)
+    try:
+        os.link(stored, tmp_path)
+    except OSError as e:
+        if e.errno == errno.EXDEV:
+            return False
+        raise
+    os.replace(tmp_path, path)
+    return True
+
+
+def dedup_jars(benchmarks: list[dict], store_dir: str, jobs: int = 1) -> DedupStats:
+    """
+    Moves all the jar files from the class paths of `benchmarks` into a content-addressed store
+    and replaces them with hard links to the store, so identical jars are kept on disk only once.
+    Stored jars are read-only, and an existing stored jar is checked against its digest before it is reused.
+    If a jar cannot be hard-linked (the store is on a different file system), the class path
+    entry of the benchmark is rewritten to point to the store instead.
+    `benchmarks` are updated in place, running the dedup again on the same benchmarks is a no-op.
+    """
+    stats = DedupStats()
+    jars = sorted({
+        path for benchmark in benchmarks for path in benchmark['classPath']
+        if path.endswith('.jar') and os.path.isfile(path)
+    })
+    stats.jars = len(jars)
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        digests = dict(zip(jars, executor.map(file_hash, jars)))
+    stats.unique_jars = len(set(digests.values()))
+
+    rewritten = {}
+    verified = set()
+    for path in jars:
+        stored = store_path(store_dir, digests[path], path)
+        is_new = not os.path.exists(stored)
+        if not is_new and stored not in verified and not os.path.samefile(path, stored) \
+                and file_hash(stored) != digests[path]:
+            logging.warning(f'Stored jar {stored} does not match its digest, replacing it')
+            os.remove(stored)
+            is_new = True
+        verified.add(stored)
+        if is_new:
+            os.makedirs(os.path.dirname(stored), exist_ok=True)
+            try:
+                os.link(path, stored)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                shutil.copy2(path, stored)
+        make_read_only(stored)
+
+        if os.path.samefile(path, stored):
+            continue
+
+        size = os.path.getsize(path)
+        if link_to_store(path, stored):
+            stats.linked_jars += 1
+        else:
+            os.remove(path)
+            rewritten[path] = stored
+            stats.rewritten_jars += 1
+        if not is_new:
+            stats.saved_bytes += size
+
+    for benchmark in benchmarks:
+        benchmark['classPath'] = [rewritten.get(path, path) for path in benchmark['classPath']]
+
+    return stats
+
+
+def main():
+    logging.basicConfig(
+        format='[%(asctime)s][%(levelname)s] %(message)s',
+        level=logging.INFO
+    )
+
+    parser = argparse.ArgumentParser(description="Deduplicates dependency jars of the benchmarks")
+    parser.add_argument("benchmarks", type=str, help="Path to benchmarks.json, it is updated in place")
+    parser.add_argument("store", type=str, help="Path to the content-addressed jar store")
+    parser.add_argument("--jobs", type=int, default=1, help="Number of threads used to hash the jars")
+    args = parser.parse_args()
+
+    with open(args.benchmarks) as file:
+        benchmarks = json.load(file)
+
+    stats = dedup_jars(benchmarks, os.path.abspath(args.store), args.jobs)
+    logging.info(f'Deduplicated dependency jars: {stats}')
+
+    with open(args.benchmarks, 'w') as file:
+        file.write(json.dumps(benchmarks, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,61 @@
 #!/bin/python3
 import argparse
 import collections
+import json
+import os
 import subprocess
 import sys
-import tempfile
 
+from compose_runner import DEFAULT_LOG_SIZE
+from compose_runner import run_compose
 from generate_compose import EvoSuiteArgs
 from generate_compose import KexArgs
 from generate_compose import TestSparkArgs
 from generate_compose import JazzerArgs
 from generate_compose import ManualArgs
+from generate_compose import NetworkMode
 from generate_compose import Tool
+from generate_compose import ToolArgs
+from generate_compose import WorkerResources
 from generate_compose import generate_compose
+from generate_compose import get_runner_name
+from generate_compose import get_worker_jobs
+from native_backend import create_workers
+from native_backend import run_workers
+from planning import COST_SOURCES
+from planning import estimate_costs
+from planning import estimate_job_times
+from planning import exclude_finished
+from planning import get_plan_dir
+from planning import get_queue_dir
+from planning import get_shard_dir
+from planning import read_history_costs
+from planning import read_history_sizes
+from planning import move_incomplete
+from planning import partition_lpt
+from planning import plan_jobs
+from planning import select_shard
+from planning import simulate_queue
+from planning import split_runs
+from planning import write_benchmark_subsets
+from planning import write_job_plans
+from planning import write_queue
+from worker_sizing import BENCHMARK_OVERHEAD
+from worker_sizing import TOOL_PROFILES
+from worker_sizing import choose_workers
+from worker_sizing import expected_throughput
+from worker_sizing import get_available_cores
+from worker_sizing import get_available_memory
+from worker_watchdog import DEFAULT_GRACE
+from worker_watchdog import Watchdog
 
 # Global parameters
 RUNNER_IMAGE = "abdullin/tga-pipeline:runner-0.0.46"
 TOOL_IMAGE = "abdullin/tga-pipeline:tools-0.0.46"
 BENCHMARKS_FILE = "/var/benchmarks/gitbug/benchmarks.json"
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+# max worker load relative to the mean one, above which the plan is reported as imbalanced
+IMBALANCE_THRESHOLD = 1.2
 
 
 class IntRange(collections.abc.Iterable[int]):
@@ -31,6 +70,314 @@ class IntRange(collections.abc.Iterable[int]):
         return iter([f'[{self.start}..{self.end}]'])
 
 
+def validate_benchmarks(
+        mode: str,
+        run_name: str,
+        output: str,
+        benchmarks_file: str = BENCHMARKS_FILE,
+        native: bool = False
+) -> str:
+    """
+    Validates the benchmarks inside the runner image (or locally for the native backend),
+    so the paths are checked exactly as the runner sees them.
+    The report is written into the results folder as `validation-<run name>.json`.
+
+    :return: Path to the benchmarks file that should be used by the runners.
+    """
+    report_file = f'validation-{run_name}.json'
+    valid_benchmarks_file = f'benchmarks-{run_name}.json'
+    if native:
+        command = [
+            sys.executable, os.path.join(SCRIPTS_DIR, 'validate_benchmarks.py'), benchmarks_file,
+            '--report', os.path.join(output, report_file),
+        ]
+        if mode == 'exclude':
+            command += ['--output', os.path.join(output, valid_benchmarks_file)]
+    else:
+        command = [
+            'docker', 'run', '--rm',
+            '--user', str(os.getpid()),
+            '--entrypoint', 'python3',
+            '-v', f'{SCRIPTS_DIR}:/var/validation-scripts:ro',
+            '-v', f'{output}:/var/results',
+            RUNNER_IMAGE,
+            '/var/validation-scripts/validate_benchmarks.py', benchmarks_file,
+            '--report', f'/var/results/{report_file}',
+        ]
+        if mode == 'exclude':
+            command += ['--output', f'/var/results/{valid_benchmarks_file}']
+
+    result = subprocess.run(command)
+    # exit code 1 means that some of the benchmarks are invalid, anything else is a failure of the validation itself
+    if result.returncode not in (0, 1):
+        print(f'Benchmark validation failed with exit code {result.returncode}', file=sys.stderr)
+        sys.exit(1)
+    if result.returncode == 0:
+        return benchmarks_file
+
+    if mode == 'refuse':
+        print(f'Some of the benchmarks are invalid, see {os.path.join(output, report_file)}', file=sys.stderr)
+        sys.exit(1)
+    with open(os.path.join(output, report_file)) as file:
+        report = json.load(file)
+    if report['valid'] == 0:
+        print(f'None of the benchmarks are valid, see {os.path.join(output, report_file)}', file=sys.stderr)
+        sys.exit(1)
+    print(f'{report["total"] - report["valid"]} invalid benchmarks are excluded from the run, '
+          f'see {os.path.join(output, report_file)}')
+    return f'/var/results/{valid_benchmarks_file}'
+
+
+def load_benchmarks(benchmarks_file: str, output: str) -> list[dict]:
+    """
+    Reads the benchmarks file as it is seen by the runners: from the results folder, from the host
+    (for the native backend) or from the runner image.
+    """
+    if benchmarks_file.startswith('/var/results/'):
+        with open(os.path.join(output, os.path.relpath(benchmarks_file, '/var/results'))) as file:
+            return json.load(file)
+    if os.path.isfile(benchmarks_file):
+        with open(benchmarks_file) as file:
+            return json.load(file)
+
+    result = subprocess.run(
+        ['docker', 'run', '--rm', '--entrypoint', 'cat', RUNNER_IMAGE, benchmarks_file],
+        stdout=subprocess.PIPE, check=True
+    )
+    return json.loads(result.stdout)
+
+
+def parse_shard(value: str) -> tuple[int, int]:
+    try:
+        shard, shards = map(int, value.split('/'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'shard should be in format i/N, got {value}')
+    if not 0 <= shard < shards:
+        raise argparse.ArgumentTypeError(f'shard index should be in [0..{shards - 1}], got {shard}')
+    return shard, shards
+
+
+def get_tool_args(
+        tool: Tool,
+        kex_options: list[str] = None,
+        llm: str = None,
+        llm_token: str = None,
+        space_user: str = None,
+        space_token: str = None,
+        prompt: str = None
+) -> ToolArgs:
+    tool_args = None
+    if tool == Tool.kex:
+        tool_args = KexArgs(kex_options if kex_options is not None else [])
+    elif tool == Tool.EvoSuite:
+        tool_args = EvoSuiteArgs()
+    elif tool == Tool.TestSpark:
+        assert llm is not None
+        assert llm_token is not None
+        assert space_user is not None
+        assert space_token is not None
+        tool_args = TestSparkArgs(
+            model_name=llm,
+            model_token=llm_token,
+            space_user=space_user,
+            space_token=space_token,
+            prompt=prompt,
+        )
+    elif tool == Tool.Jazzer:
+        tool_args = JazzerArgs()
+    elif tool == Tool.Manual:
+        tool_args = ManualArgs()
+    else:
+        print(f'Unknown tool {tool}', file=sys.stderr)
+    return tool_args
+
+
+def parse_workers(value: str):
+    if value == 'auto':
+        return value
+    try:
+        return int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f'number of workers should be an integer or "auto", got {value}')
+
+
+def plan_missing_jobs(
+        tool: Tool,
+        run_name: str,
+        runs: int,
+        build_ids: list[str],
+        output: str,
+        shard: tuple[int, int] = None
+) -> list:
+    """
+    Scans the results folder for complete results and returns the (run, benchmark) pairs that are still missing.
+    Incomplete results are moved out of the results tree, so they are executed again.
+    If `shard` is set, only the slice of the (run, benchmark) pairs that belongs to the shard is considered.
+    """
+    jobs = plan_jobs(range(runs), build_ids)
+    if shard is not None:
+        jobs = select_shard(jobs, *shard)
+    moved = move_incomplete(jobs, output, tool.value, run_name)
+    missing = exclude_finished(jobs, output, tool.value, run_name)
+    done = len(jobs) - len(missing)
+    print(f'{done} out of {len(jobs)} results are done ({done / max(len(jobs), 1) * 100:.1f}%), '
+          f'{len(missing)} remaining, {moved} incomplete results are moved to incomplete-{run_name}')
+    return missing
+
+
+def create_queue(
+        tool: Tool,
+        run_name: str,
+        runs: int,
+        cost_source: str,
+        benchmarks_file: str,
+        output: str,
+        shard: tuple[int, int] = None
+) -> str:
+    """
+    Creates a shared job queue with all the (run, benchmark) pairs that do not have results yet.
+    If `cost_source` is set, the most expensive jobs are queued first.
+
+    :return: Path to the queue as it is seen by the runners.
+    """
+    build_ids = [benchmark['build_id'] for benchmark in load_benchmarks(benchmarks_file, output)]
+    jobs = plan_missing_jobs(tool, run_name, runs, build_ids, output, shard)
+    if cost_source is not None:
+        costs = estimate_costs(build_ids, cost_source, output, tool.value)
+        jobs.sort(key=lambda job: -costs[job.build_id])
+    queue_dir = get_queue_dir(output, run_name)
+    write_queue(queue_dir, jobs)
+    print(f'Created a job queue with {len(jobs)} jobs in {queue_dir}')
+    return f'/var/results/{os.path.basename(queue_dir)}'
+
+
+def create_resume_plans(
+        tool: Tool,
+        run_name: str,
+        runs: int,
+        workers: int,
+        cost_source: str,
+        benchmarks_file: str,
+        output: str,
+        shard: tuple[int, int] = None
+) -> list[str]:
+    """
+    Spreads the missing (run, benchmark) pairs between the workers, evenly or by their estimated cost.
+
+    :return: Paths to the plan files of the workers as they are seen by the runners.
+    """
+    build_ids = [benchmark['build_id'] for benchmark in load_benchmarks(benchmarks_file, output)]
+    jobs = plan_missing_jobs(tool, run_name, runs, build_ids, output, shard)
+    if not jobs:
+        return []
+    costs = estimate_costs(build_ids, cost_source if cost_source is not None else 'uniform', output, tool.value)
+    partitions = partition_lpt({job: costs[job.build_id] for job in jobs}, workers)
+
+    plan_dir = get_plan_dir(output, run_name)
+    names = write_job_plans(plan_dir, partitions)
+    return [f'/var/results/{os.path.basename(plan_dir)}/{name}' for name in names]
+
+
+def partition_benchmarks(
+        tool: Tool,
+        run_name: str,
+        workers: int,
+        cost_source: str,
+        benchmarks_file: str,
+        output: str
+) -> list[str]:
+    """
+    Splits the benchmarks between the workers by their estimated cost.
+
+    :return: Paths to the benchmark subset files of the workers as they are seen by the runners.
+    """
+    benchmarks = load_benchmarks(benchmarks_file, output)
+    costs = estimate_costs([benchmark['build_id'] for benchmark in benchmarks], cost_source, output, tool.value)
+    partitions = partition_lpt(costs, workers)
+
+    loads = [sum(costs[build_id] for build_id in partition) for partition in partitions]
+    mean_load = sum(loads) / len(loads)
+    print(f'Estimated worker loads ({cost_source}): {", ".join(f"{load:.1f}" for load in loads)}, '
+          f'max is {max(loads) / mean_load * 100 - 100:.1f}% above the mean')
+
+    plan_dir = get_plan_dir(output, run_name)
+    names = write_benchmark_subsets(plan_dir, benchmarks, partitions)
+    return [f'/var/results/{os.path.basename(plan_dir)}/{name}' for name in names]
+
+
+def dry_run(args, tool_args: ToolArgs, resources: WorkerResources, benchmarks_file: str) -> None:
+    """
+    Prints the plan of the experiment and estimates its wall-clock time, CPU-hours and disk usage
+    from the earlier results of the tool in the output folder, or from the timeout if there are none.
+    Nothing is written and no containers are started.
+    """
+    output = os.path.abspath(args.output)
+    build_ids = [benchmark['build_id'] for benchmark in load_benchmarks(benchmarks_file, output)]
+    history_times = read_history_costs(output, args.tool.value)
+    history_sizes = read_history_sizes(output, args.tool.value)
+    job_times = estimate_job_times(build_ids, args.timeout, BENCHMARK_OVERHEAD, output, args.tool.value, history_times)
+
+    jobs = plan_jobs(range(args.runs), build_ids)
+    if args.shard is not None:
+        jobs = select_shard(jobs, *args.shard)
+    missing = exclude_finished(jobs, output, args.tool.value, args.runName)
+    print(f'{len(jobs) - len(missing)} out of {len(jobs)} results are done, {len(missing)} remaining, '
+          f'generation times are known for {len(history_times)} out of {len(build_ids)} benchmarks')
+
+    queue_path = None
+    plan_files = None
+    benchmark_subsets = None
+    cost_source = args.cost if args.cost is not None else 'uniform'
+    if args.queue:
+        if args.cost is not None:
+            costs = estimate_costs(build_ids, args.cost, output, args.tool.value)
+            missing.sort(key=lambda job: -costs[job.build_id])
+        loads = simulate_queue([job_times[job.build_id] for job in missing], args.workers)
+        queue_path = f'/var/results/{os.path.basename(get_queue_dir(output, args.runName))}'
+    elif args.resume:
+        costs = estimate_costs(build_ids, cost_source, output, args.tool.value)
+        partitions = partition_lpt({job: costs[job.build_id] for job in missing}, args.workers)
+        loads = [sum(job_times[job.build_id] for job in partition) for partition in partitions]
+        plan_dir = os.path.basename(get_plan_dir(output, args.runName))
+        plan_files = [f'/var/results/{plan_dir}/worker-{worker}.plan' for worker in range(len(partitions))]
+    elif args.cost is not None:
+        costs = estimate_costs(build_ids, args.cost, output, args.tool.value)
+        partitions = [set(partition) for partition in partition_lpt(costs, args.workers)]
+        loads = [sum(job_times[job.build_id] for job in missing if job.build_id in partition)
+                 for partition in partitions]
+        plan_dir = os.path.basename(get_plan_dir(output, args.runName))
+        benchmark_subsets = [f'/var/results/{plan_dir}/worker-{worker}.json' for worker in range(len(partitions))]
+    else:
+        loads = [sum(job_times[job.build_id] for job in missing if job.run in runs)
+                 for runs in split_runs(args.runs, args.workers)]
+
+    compose_file = generate_compose(args.tool, tool_args,
+                                    args.runName, args.runs, args.timeout, args.workers, args.output,
+                                    RUNNER_IMAGE, TOOL_IMAGE, benchmarks_file, queue_path, benchmark_subsets,
+                                    plan_files, resources, args.network)
+    print(compose_file)
+    print()
+
+    for worker, load in enumerate(loads):
+        print(f'Worker {worker}: {load / 3600:.1f} hours')
+
+    cores = args.cpusPerWorker if args.cpusPerWorker is not None else TOOL_PROFILES[args.tool][0]
+    print(f'Estimated wall-clock time: {max(loads, default=0) / 3600:.1f} hours')
+    print(f'Estimated CPU time: {sum(loads) * cores / 3600:.1f} CPU-hours ({cores} cores per worker)')
+    if history_sizes:
+        mean_size = sum(history_sizes.values()) / len(history_sizes)
+        disk_usage = sum(history_sizes.get(job.build_id, mean_size) for job in missing)
+        print(f'Estimated disk usage: {disk_usage / (1024 * 1024 * 1024):.2f} GiB')
+    else:
+        print('Estimated disk usage: unknown, there are no earlier results')
+
+    mean_load = sum(loads) / len(loads) if loads else 0
+    if mean_load > 0 and max(loads) / mean_load > IMBALANCE_THRESHOLD:
+        print(f'WARNING: the plan is imbalanced, the most loaded worker has '
+              f'{max(loads) / mean_load * 100 - 100:.0f}% more work than the mean, '
+              f'consider using --queue or --cost', file=sys.stderr)
+
+
 def main():
     parser = argparse.ArgumentParser(description="TGA pipeline executor")
     # general args
@@ -38,8 +385,62 @@ def main():
     parser.add_argument("--runName", type=str, help="Name of the experiment", required=True)
     parser.add_argument("--runs", type=int, choices=IntRange(0, 100_000), help="Number of total runs", required=True)
     parser.add_argument("--timeout", type=int, help="Timeout in seconds", required=True)
-    parser.add_argument("--workers", type=int, help="Number of parallel workers", required=True)
+    parser.add_argument("--workers", type=parse_workers,
+                        help="Number of parallel workers, or \"auto\" to choose it by the available cores and memory",
+                        required=True)
     parser.add_argument("--output", type=str, help="Path to folder with output", required=True)
+    parser.add_argument("--validate", type=str, choices=['refuse', 'exclude'],
+                        help="Validate the benchmarks before the run and either refuse to run "
+                             "if some of them are invalid or exclude the invalid ones from the run",
+                        required=False)
+    parser.add_argument("--queue", action='store_true',
+                        help="Workers pull (run, benchmark) jobs from a shared queue instead of fixed run ranges",
+                        required=False)
+    parser.add_argument("--cost", type=str, choices=COST_SOURCES,
+                        help="Split the benchmarks between the workers by their estimated cost "
+                             "instead of splitting the runs, with --queue the most expensive jobs are queued first",
+                        required=False)
+    parser.add_argument("--resume", action='store_true',
+                        help="Schedule only the (run, benchmark) pairs that do not have complete results yet",
+                        required=False)
+    parser.add_argument("--cpusPerWorker", type=int, help="Number of cores available to each worker", required=False)
+    parser.add_argument("--pinCpus", action='store_true',
+                        help="Pin each worker to its own cores, requires --cpusPerWorker", required=False)
+    parser.add_argument("--memoryPerWorker", type=int,
+                        help="Memory limit of each tool container in MiB, JVM heap size is derived from it",
+                        required=False)
+    parser.add_argument("--scratchSize", type=int,
+                        help="Size of the in-memory /tmp of each tool container in MiB, counts towards the memory limit",
+                        required=False)
+    parser.add_argument("--network", type=NetworkMode, choices=list(NetworkMode), default=NetworkMode.shared,
+                        help="How the tools are connected to the runners: one network for all the workers (default), "
+                             "a network per worker, or the host network with a separate port for each runner",
+                        required=False)
+    parser.add_argument("--backend", type=str, choices=['compose', 'native'], default='compose',
+                        help="Run the workers as Docker Compose services (default) or as local JVM processes",
+                        required=False)
+    parser.add_argument("--benchmarks", type=str, default=BENCHMARKS_FILE,
+                        help="Path to benchmarks.json as it is seen by the runners, "
+                             "i.e. a host path for the native backend",
+                        required=False)
+    parser.add_argument("--pipelineHome", type=str,
+                        default=os.environ.get('TGA_PIPELINE_HOME', os.path.dirname(SCRIPTS_DIR)),
+                        help="Path to the built pipeline, used by the native backend",
+                        required=False)
+    parser.add_argument("--logSize", type=int, default=DEFAULT_LOG_SIZE,
+                        help="Size of a log file of a service in MiB, after which it is rotated",
+                        required=False)
+    parser.add_argument("--watchdogGrace", type=int, default=DEFAULT_GRACE,
+                        help="Restart a worker that has not started a new job for timeout + this many seconds, "
+                             "0 disables the watchdog",
+                        required=False)
+    parser.add_argument("--dry-run", action='store_true',
+                        help="Print the plan and estimate the time and disk usage of the experiment without running it",
+                        required=False)
+    parser.add_argument("--shard", type=parse_shard,
+                        help="Run only the shard i out of N (0 <= i < N) of the (run, benchmark) pairs, "
+                             "results are written to shard-i-of-N subfolder of the output folder",
+                        required=False)
 
     # kex args
     parser.add_argument("--kexOption", type=str, action='append', nargs='+',
@@ -57,42 +458,97 @@ def main():
     print(args)
     print(args.tool)
 
-    tool_args = None
-    if args.tool == Tool.kex:
-        tool_args = KexArgs(args.kexOption if args.kexOption is not None else [])
-    elif args.tool == Tool.EvoSuite:
-        tool_args = EvoSuiteArgs()
-    elif args.tool == Tool.TestSpark:
-        assert args.llm is not None
-        assert args.llmToken is not None
-        assert args.spaceUser is not None
-        assert args.spaceToken is not None
-        tool_args = TestSparkArgs(
-            model_name=args.llm,
-            model_token=args.llmToken,
-            space_user=args.spaceUser,
-            space_token=args.spaceToken,
-            prompt=args.prompt,
-        )
-    elif args.tool == Tool.Jazzer:
-        tool_args = JazzerArgs()
-    elif args.tool == Tool.Jazzer:
-        tool_args = ManualArgs()
-    else:
-        print(f'Unknown tool {args.tool}', file=sys.stderr)
+    tool_args = get_tool_args(args.tool, args.kexOption, args.llm, args.llmToken, args.spaceUser, args.spaceToken,
+                              args.prompt)
+
+    if args.workers == 'auto':
+        args.workers = choose_workers(args.tool, args.cpusPerWorker, args.memoryPerWorker)
+        if not args.queue and args.cost is None and not args.resume and args.shard is None:
+            # static split gives each worker at least one whole run, the extra workers would have nothing to do
+            args.workers = min(args.workers, max(1, args.runs))
+        print(f'Using {args.workers} workers for {args.tool.value} '
+              f'({get_available_cores():g} cores and {get_available_memory()} MiB of memory are available), '
+              f'expected throughput is at least {expected_throughput(args.workers, args.timeout):.1f} '
+              f'benchmarks per hour')
+
+    if args.pinCpus and args.cpusPerWorker is None:
+        parser.error('--pinCpus requires --cpusPerWorker')
+    if args.memoryPerWorker is not None and args.scratchSize is not None and args.memoryPerWorker <= args.scratchSize:
+        parser.error('--memoryPerWorker should be larger than --scratchSize')
+    if args.pinCpus and args.workers * args.cpusPerWorker > os.cpu_count():
+        parser.error(f'{args.workers} workers with {args.cpusPerWorker} cores each do not fit '
+                     f'into {os.cpu_count()} available cores')
+    resources = WorkerResources(args.cpusPerWorker, args.memoryPerWorker, args.scratchSize, args.pinCpus)
 
+    if args.shard is not None:
+        # each shard writes into its own subtree, merge_shards.py assembles them into a single results tree
+        args.output = get_shard_dir(args.output, *args.shard)
+        if not args.queue:
+            args.resume = True
+
+    native = args.backend == 'native'
+    if native and (args.pinCpus or args.cpusPerWorker is not None or args.memoryPerWorker is not None
+                   or args.scratchSize is not None or args.network != NetworkMode.shared):
+        print('Resource and network options are ignored by the native backend', file=sys.stderr)
+
+    benchmarks_file = args.benchmarks
+    if args.dry_run:
+        dry_run(args, tool_args, resources, benchmarks_file)
+        return
+
+    if args.validate is not None:
+        os.makedirs(args.output, exist_ok=True)
+        benchmarks_file = validate_benchmarks(args.validate, args.runName, os.path.abspath(args.output),
+                                              benchmarks_file, native)
+
+    queue_path = None
+    if args.queue:
+        os.makedirs(args.output, exist_ok=True)
+        queue_path = create_queue(args.tool, args.runName, args.runs, args.cost,
+                                  benchmarks_file, os.path.abspath(args.output), args.shard)
+
+    plan_files = None
+    if args.resume and not args.queue:
+        os.makedirs(args.output, exist_ok=True)
+        plan_files = create_resume_plans(args.tool, args.runName, args.runs, args.workers, args.cost,
+                                         benchmarks_file, os.path.abspath(args.output), args.shard)
+        if not plan_files:
+            print('All the results are already done')
+            return
+
+    benchmark_subsets = None
+    if args.cost is not None and not args.queue and not args.resume:
+        os.makedirs(args.output, exist_ok=True)
+        benchmark_subsets = partition_benchmarks(args.tool, args.runName, args.workers, args.cost,
+                                                 benchmarks_file, os.path.abspath(args.output))
+
+    output = os.path.abspath(args.output)
+    log_dir = os.path.join(output, f'logs-{args.runName}')
+    worker_jobs = get_worker_jobs(args.runs, args.workers, benchmarks_file, queue_path, benchmark_subsets, plan_files)
+    watchdog = None
+    if args.watchdogGrace > 0:
+        watchdog = Watchdog(output, args.runName, args.timeout, args.watchdogGrace)
+
+    if native:
+        os.makedirs(log_dir, exist_ok=True)
+        workers = create_workers(args.pipelineHome, args.tool, tool_args, args.runName, args.timeout, output,
+                                 worker_jobs, log_dir, watchdog)
+        if not run_workers(workers, args.pipelineHome, watchdog):
+            sys.exit(1)
+        return
+
+    heartbeat_path = None
+    if watchdog is not None:
+        heartbeat_path = f'/var/results/{os.path.basename(watchdog.heartbeat_dir)}'
+        for worker in range(len(worker_jobs)):
+            watchdog.add_worker(get_runner_name(args.tool, worker), args.tool.value, args.runName)
     compose_file = generate_compose(args.tool, tool_args,
                                     args.runName, args.runs, args.timeout, args.workers, args.output,
-                                    RUNNER_IMAGE, TOOL_IMAGE, BENCHMARKS_FILE)
-
-    tmp = tempfile.NamedTemporaryFile()
-    with open(tmp.name, 'w') as file:
-        print(file.name)
-        print(compose_file)
-        file.write(str(compose_file))
+                                    RUNNER_IMAGE, TOOL_IMAGE, benchmarks_file, queue_path, benchmark_subsets,
+                                    plan_files, resources, args.network, heartbeat_path=heartbeat_path)
 
-    subprocess.run(['docker-compose', '-f', tmp.name, 'up'])
-    subprocess.run(['docker-compose', '-f', tmp.name, 'down'])
+    if not run_compose(compose_file, log_dir, args.logSize, watchdog):
+        sys.exit(1)
 
 
 if __name__ == '__main__':
@@ -0,0 +1,163 @@
+#!/bin/python3
+import argparse
+import json
+import os
+import sys
+
+from compose_runner import run_compose
+from execute_benchmark import BENCHMARKS_FILE
+from execute_benchmark import RUNNER_IMAGE
+from execute_benchmark import TOOL_IMAGE
+from execute_benchmark import get_tool_args
+from execute_benchmark import load_benchmarks
+from execute_benchmark import plan_missing_jobs
+from generate_compose import ComposeFile
+from generate_compose import NetworkMode
+from generate_compose import Tool
+from generate_compose import WorkerResources
+from generate_compose import generate_compose
+from generate_compose import get_runner_name
+from planning import apportion_workers
+from planning import estimate_costs
+from planning import estimate_job_times
+from planning import exclude_finished
+from planning import get_queue_dir
+from planning import plan_jobs
+from planning import write_queue
+from worker_sizing import BENCHMARK_OVERHEAD
+from worker_watchdog import DEFAULT_GRACE
+from worker_watchdog import Watchdog
+from worker_watchdog import get_heartbeat_dir
+
+
+class Experiment:
+    """
+    Single configuration of the matrix: a tool with its arguments, executed under its own run name.
+    """
+
+    def __init__(self, spec: dict, defaults: dict):
+        self.tool = Tool(spec['tool'])
+        self.run_name = spec['runName']
+        self.runs = spec.get('runs', defaults.get('runs'))
+        self.timeout = spec.get('timeout', defaults.get('timeout'))
+        assert self.runs is not None, f'number of runs is not set for {self.run_name}'
+        assert self.timeout is not None, f'timeout is not set for {self.run_name}'
+        self.tool_args = get_tool_args(
+            self.tool,
+            spec.get('kexOptions'),
+            spec.get('llm'),
+            spec.get('llmToken'),
+            spec.get('spaceUser'),
+            spec.get('spaceToken'),
+            spec.get('prompt'),
+        )
+        self.jobs = []
+
+    def estimate_work(self, output: str) -> float:
+        """
+        Remaining work in seconds, based on the earlier results of the tool or on the timeout.
+        """
+        build_ids = list({job.build_id for job in self.jobs})
+        job_times = estimate_job_times(build_ids, self.timeout, BENCHMARK_OVERHEAD, output, self.tool.value)
+        return sum(job_times[job.build_id] for job in self.jobs)
+
+
+def read_matrix(path: str) -> tuple[dict, list[Experiment]]:
+    with open(path) as file:
+        spec = json.load(file)
+    experiments = [Experiment(experiment, spec) for experiment in spec['experiments']]
+    run_names = [experiment.run_name for experiment in experiments]
+    duplicates = {name for name in run_names if run_names.count(name) > 1}
+    assert not duplicates, f'run names should be unique, duplicates: {", ".join(sorted(duplicates))}'
+    return spec, experiments
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Runs a matrix of tools and configurations on a shared worker pool")
+    parser.add_argument("matrix", type=str, help="Path to the JSON matrix specification")
+    parser.add_argument("--workers", type=int, help="Total number of parallel workers", required=True)
+    parser.add_argument("--output", type=str, help="Path to folder with output", required=True)
+    parser.add_argument("--dry-run", action='store_true',
+                        help="Print the split of the workers and the compose file without running it",
+                        required=False)
+    args = parser.parse_args()
+
+    spec, experiments = read_matrix(args.matrix)
+    output = os.path.abspath(args.output)
+    if not args.dry_run:
+        os.makedirs(output, exist_ok=True)
+
+    build_ids = [benchmark['build_id'] for benchmark in load_benchmarks(BENCHMARKS_FILE, output)]
+    for experiment in experiments:
+        if args.dry_run:
+            jobs = plan_jobs(range(experiment.runs), build_ids)
+            experiment.jobs = exclude_finished(jobs, output, experiment.tool.value, experiment.run_name)
+        else:
+            experiment.jobs = plan_missing_jobs(experiment.tool, experiment.run_name, experiment.runs, build_ids,
+                                                output)
+        cost_source = spec.get('cost')
+        if cost_source is not None:
+            costs = estimate_costs(build_ids, cost_source, output, experiment.tool.value)
+            experiment.jobs.sort(key=lambda job: -costs[job.build_id])
+
+    work = [experiment.estimate_work(output) for experiment in experiments]
+    if sum(work) == 0:
+        print('All the results are already done')
+        return
+    if args.workers < sum(1 for amount in work if amount > 0):
+        print('At least one worker per unfinished experiment is needed', file=sys.stderr)
+        sys.exit(1)
+    workers = apportion_workers(work, args.workers)
+
+    resources = WorkerResources(
+        spec.get('cpusPerWorker'),
+        spec.get('memoryPerWorker'),
+        spec.get('scratchSize'),
+        spec.get('pinCpus', False),
+    )
+    network_mode = NetworkMode(spec.get('network', NetworkMode.shared.value))
+    watchdog_grace = spec.get('watchdogGrace', DEFAULT_GRACE)
+    heartbeat_dir = get_heartbeat_dir(output, 'matrix')
+    heartbeat_path = f'/var/results/{os.path.basename(heartbeat_dir)}' if watchdog_grace > 0 else None
+
+    compose_file = ComposeFile()
+    worker_offset = 0
+    # (runner name, tool name, run name) of each worker, so the watchdog can find their results
+    runners = []
+    for experiment, experiment_workers, experiment_work in zip(experiments, workers, work):
+        print(f'{experiment.run_name} ({experiment.tool.value}): {len(experiment.jobs)} jobs, '
+              f'estimated {experiment_work / 3600:.1f} worker-hours, {experiment_workers} workers')
+        if experiment_workers == 0:
+            continue
+
+        queue_dir = get_queue_dir(output, experiment.run_name)
+        if not args.dry_run:
+            write_queue(queue_dir, experiment.jobs)
+        generate_compose(experiment.tool, experiment.tool_args,
+                         experiment.run_name, experiment.runs, experiment.timeout, experiment_workers, args.output,
+                         RUNNER_IMAGE, TOOL_IMAGE, BENCHMARKS_FILE,
+                         queue_path=f'/var/results/{os.path.basename(queue_dir)}',
+                         resources=resources,
+                         network_mode=network_mode,
+                         worker_offset=worker_offset,
+                         compose_file=compose_file,
+                         heartbeat_path=heartbeat_path)
+        runners += [(get_runner_name(experiment.tool, worker), experiment.tool.value, experiment.run_name)
+                    for worker in range(worker_offset, worker_offset + experiment_workers)]
+        worker_offset += experiment_workers
+
+    if args.dry_run:
+        print(compose_file)
+        return
+    watchdog = None
+    if watchdog_grace > 0:
+        # a single watchdog for all the experiments, so the longest timeout is used
+        watchdog = Watchdog(output, 'matrix', max(experiment.timeout for experiment in experiments), watchdog_grace)
+        for runner, tool_name, run_name in runners:
+            watchdog.add_worker(runner, tool_name, run_name)
+    if not run_compose(compose_file, os.path.join(output, 'logs-matrix'), watchdog=watchdog):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
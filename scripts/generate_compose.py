@@ -11,6 +11,33 @@ class Tool(Enum):
     Manual = 'Manual'
 
 
+# maximal number of JVMs started by tga-tool that run at the same time in the tool container
+TOOL_JVMS = {
+    Tool.kex: 2,  # kex and its executor
+    Tool.EvoSuite: 2,  # EvoSuite master and client
+    Tool.TestSpark: 2,  # Gradle launcher and the headless IDE
+    Tool.Jazzer: 8,  # up to 8 fuzzers, see `MAX_TARGETS` of `JazzerCliTool`
+    Tool.Manual: 0,
+}
+# launcher of tga-tool in the tool image, see `dockerfiles/tools.docker`
+TOOL_JAR = '/tga-pipeline/tga-tool/build/libs/tga-tool.jar'
+
+
+class NetworkMode(Enum):
+    # separate bridge network for each runner/tool pair, Docker runs out of address pools after a few dozen workers
+    per_worker = 'per_worker'
+    # single bridge network for all the workers, runners are distinguished by their service names
+    shared = 'shared'
+    # host network, each runner listens on its own port
+    host = 'host'
+
+    def __str__(self):
+        return self.value
+
+
+RUNNER_PORT = 10000
+
+
 class ToolArgs:
     pass
 
@@ -100,21 +127,58 @@ class Service:
         self.image = image
         self.user = user
         self.command = command
+        self.entrypoint = None
         self.networks = []
+        self.network_mode = None
         self.volumes = {}
+        self.cpuset = None
+        self.cpus = None
+        self.mem_limit = None
+        self.environment = {}
+        self.tmpfs = []
+        self.log_options = {}
 
     def print(self, indent: int = 2) -> str:
-        return '\n'.join([
+        lines = [
             f'{make_indent(indent)}{self.name}:',
             f'{make_indent(indent * 2)}image: {self.image}',
             f'{make_indent(indent * 2)}user: {self.user}',
             f'{make_indent(indent * 2)}command: {self.command}',
-            f'{make_indent(indent * 2)}networks:',
-            '\n'.join([f'{make_indent(indent * 3)}- {network.name}' for network in self.networks]),
+        ]
+        if self.entrypoint is not None:
+            lines.append(f'{make_indent(indent * 2)}entrypoint: [{", ".join(f"{arg!r}" for arg in self.entrypoint)}]')
+        if self.network_mode is not None:
+            lines.append(f'{make_indent(indent * 2)}network_mode: {self.network_mode}')
+        else:
+            lines += [
+                f'{make_indent(indent * 2)}networks:',
+                '\n'.join([f'{make_indent(indent * 3)}- {network.name}' for network in self.networks]),
+            ]
+        lines += [
             f'{make_indent(indent * 2)}volumes:',
             '\n'.join([f'{make_indent(indent * 3)}- {volume.name}:{self.volumes[volume]}' for volume in
                        self.volumes]),
-        ])
+        ]
+        if self.cpuset is not None:
+            lines.append(f'{make_indent(indent * 2)}cpuset: \"{self.cpuset}\"')
+        if self.cpus is not None:
+            lines.append(f'{make_indent(indent * 2)}cpus: {self.cpus}')
+        if self.mem_limit is not None:
+            lines.append(f'{make_indent(indent * 2)}mem_limit: {self.mem_limit}')
+        if self.environment:
+            lines.append(f'{make_indent(indent * 2)}environment:')
+            lines += [f'{make_indent(indent * 3)}{key}: \"{value}\"' for key, value in self.environment.items()]
+        if self.tmpfs:
+            lines.append(f'{make_indent(indent * 2)}tmpfs:')
+            lines += [f'{make_indent(indent * 3)}- {mount}' for mount in self.tmpfs]
+        if self.log_options:
+            lines += [
+                f'{make_indent(indent * 2)}logging:',
+                f'{make_indent(indent * 3)}driver: json-file',
+                f'{make_indent(indent * 3)}options:',
+            ]
+            lines += [f'{make_indent(indent * 4)}{key}: \"{value}\"' for key, value in self.log_options.items()]
+        return '\n'.join(lines)
 
     def add_network(self, network: Network) -> None:
         self.networks.append(network)
@@ -126,6 +190,70 @@ class Service:
         return self.print()
 
 
+class WorkerResources:
+    """
+    Resources of a single runner/tool pair. Runner and tool of a worker share the same cores,
+    memory limit and scratch space are applied to the tool container, as the runner itself is lightweight.
+    """
+    # part of the memory left after the scratch space that is given to the heaps of all the JVMs together,
+    # the rest is used by the non-heap memory of the JVMs and by the tool subprocesses
+    HEAP_FRACTION = 0.6
+    # heap of tga-tool itself when it starts the tool JVMs, it only drives them and collects their results;
+    # at most half of the heap budget
+    DRIVER_HEAP = 512
+    SCRATCH_MOUNT = '/tmp'
+
+    def __init__(self, cpus: int = None, memory: int = None, scratch: int = None, pin_cpus: bool = False,
+                 first_cpu: int = 0):
+        """
+        :param cpus: number of cores per worker
+        :param memory: memory limit of the tool container, in MiB
+        :param scratch: size of the tmpfs scratch space of the tool container, in MiB, it counts towards `memory`
+        :param pin_cpus: pin each worker to its own `cpus` cores, starting from `first_cpu`
+        """
+        assert not pin_cpus or cpus is not None
+        assert memory is None or scratch is None or memory > scratch
+        self.cpus = cpus
+        self.memory = memory
+        self.scratch = scratch
+        self.pin_cpus = pin_cpus
+        self.first_cpu = first_cpu
+
+    def get_cpuset(self, worker: int) -> str:
+        start = self.first_cpu + worker * self.cpus
+        return f'{start}-{start + self.cpus - 1}'
+
+    def get_heap_sizes(self, jvms: int = 0) -> tuple[int, int]:
+        """
+        :param jvms: number of JVMs started by tga-tool that run at the same time in the tool container
+        :return: Maximal heap sizes of tga-tool and of each of the `jvms` JVMs, in MiB.
+        """
+        budget = int((self.memory - (self.scratch or 0)) * self.HEAP_FRACTION)
+        if jvms == 0:
+            return budget, 0
+        driver = min(self.DRIVER_HEAP, budget // 2)
+        return driver, (budget - driver) // jvms
+
+    def apply(self, runner: Service, tool: Service, worker: int, jvms: int = 0) -> None:
+        if self.pin_cpus:
+            runner.cpuset = self.get_cpuset(worker)
+            tool.cpuset = self.get_cpuset(worker)
+        if self.cpus is not None:
+            tool.cpus = self.cpus
+        if self.memory is not None:
+            tool.mem_limit = f'{self.memory}m'
+            driver_heap, heap = self.get_heap_sizes(jvms)
+            if jvms == 0:
+                tool.environment['JAVA_TOOL_OPTIONS'] = f'-Xmx{driver_heap}m'
+            else:
+                # applies to every JVM started inside the tool container, so the rest of the heap budget is split
+                # between the tool JVMs; the command line option of tga-tool takes precedence over it
+                tool.environment['JAVA_TOOL_OPTIONS'] = f'-Xmx{heap}m'
+                tool.entrypoint = ['java', f'-Xmx{driver_heap}m', '-jar', TOOL_JAR]
+        if self.scratch is not None:
+            tool.tmpfs.append(f'{self.SCRATCH_MOUNT}:exec,mode=1777,size={self.scratch}m')
+
+
 class ComposeFile:
     def __init__(self):
         self.services = []
@@ -136,7 +264,9 @@ class ComposeFile:
         self.services.append(service)
 
     def add_network(self, network: Network):
-        self.networks.add(network)
+        # several generated parts of a compose file may refer to the same network
+        if all(existing.name != network.name for existing in self.networks):
+            self.networks.add(network)
 
     def add_volume(self, volume: Volume):
         if volume.is_external:
@@ -173,6 +303,45 @@ class IntRange(Iterable[int]):
         return iter([f'[{self.start}..{self.end}]'])
 
 
+def get_runner_name(tool: Tool, worker: int) -> str:
+    return f'runner-{tool.name}-{worker}'
+
+
+def get_worker_jobs(
+        runs: int,
+        workers: int,
+        benchmarks_path: str,
+        queue_path: str = None,
+        benchmark_subsets: list[str] = None,
+        plan_files: list[str] = None
+) -> list[tuple[str, list[str]]]:
+    """
+    Benchmarks file and the runner options defining the jobs of each worker. By default, the runs are split
+    between the workers statically, if `queue_path` is set, all the runners pull jobs from the shared job queue instead.
+    If `benchmark_subsets` are set, there is one worker per subset file, which executes all the runs on its subset.
+    If `plan_files` are set, there is one worker per plan file, which executes the (run, benchmark) pairs from it.
+    """
+    if queue_path is not None:
+        return [(benchmarks_path, ['--queue', queue_path]) for _ in range(workers)]
+    if plan_files is not None:
+        return [(benchmarks_path, ['--plan', plan_file]) for plan_file in plan_files]
+    if benchmark_subsets is not None:
+        return [(subset, ['--runs', f'0..{runs - 1}']) for subset in benchmark_subsets]
+
+    result = []
+    runs_per_thread = runs // workers
+    leftover = runs % workers
+    starting_run = 0
+    for _ in range(workers):
+        thread_runs = runs_per_thread
+        if leftover > 0:
+            thread_runs += 1
+            leftover -= 1
+        result.append((benchmarks_path, ['--runs', f'{starting_run}..{starting_run + thread_runs - 1}']))
+        starting_run += thread_runs
+    return result
+
+
 def generate_compose(
         tool: Tool,
         tool_args: ToolArgs,
@@ -183,13 +352,24 @@ def generate_compose(
         results_path: str,
         runner_image: str,
         tool_image: str,
-        benchmarks_path: str
+        benchmarks_path: str,
+        queue_path: str = None,
+        benchmark_subsets: list[str] = None,
+        plan_files: list[str] = None,
+        resources: WorkerResources = None,
+        network_mode: NetworkMode = NetworkMode.shared,
+        worker_offset: int = 0,
+        compose_file: ComposeFile = None,
+        heartbeat_path: str = None
 ) -> ComposeFile:
-    result = ComposeFile()
-
-    runs_per_thread = runs // workers
-    leftover = runs % workers
-    starting_run = 0
+    """
+    Generates a runner/tool pair of services for each of the workers, see `get_worker_jobs` for the way
+    the jobs are split between them. If `resources` are set, they are applied to each of the workers.
+    `network_mode` defines how the tools are connected to their runners.
+    Several experiments can be added to the same `compose_file`, their workers are numbered from `worker_offset`.
+    If `heartbeat_path` is set, each runner writes its heartbeat file named after its service into this folder.
+    """
+    result = compose_file if compose_file is not None else ComposeFile()
 
     result_volume = Volume(results_path, is_external=False)
     result.add_volume(result_volume)
@@ -197,36 +377,53 @@ def generate_compose(
     # os.getuid() does not work on Windows, hence pid was suggested as a replacement.
     pid = os.getpid()
 
-    for thread in range(workers):
-        thread_runs = runs_per_thread
-        if leftover > 0:
-            thread_runs += 1
-            leftover -= 1
-
-        network = Network(f'network-{tool.name}-{thread}')
-        result.add_network(network)
-
+    shared_network = Network(f'network-{tool.name}')
+    if network_mode == NetworkMode.shared:
+        result.add_network(shared_network)
+
+    worker_jobs = get_worker_jobs(runs, workers, benchmarks_path, queue_path, benchmark_subsets, plan_files)
+    for worker, (worker_benchmarks_path, jobs_options) in enumerate(worker_jobs):
+        thread = worker_offset + worker
+
+        network = shared_network
+        port = RUNNER_PORT
+        if network_mode == NetworkMode.per_worker:
+            network = Network(f'network-{tool.name}-{thread}')
+            result.add_network(network)
+        elif network_mode == NetworkMode.host:
+            port = RUNNER_PORT + thread
+
+        runner_name = get_runner_name(tool, thread)
+        if heartbeat_path is not None:
+            jobs_options = jobs_options + ['--heartbeat', f'{heartbeat_path}/{runner_name}']
         runner_service = Service(
-            name=f'runner-{tool.name}-{thread}',
+            name=runner_name,
             image=runner_image,
             user=f'\"{pid}\"',
-            command=f'-p 10000 -c {benchmarks_path} -t {timeout} -o /var/results '
-                    f'--runName {run_name} --runs {starting_run}..{starting_run + thread_runs - 1}'
+            command=f'-p {port} -c {worker_benchmarks_path} -t {timeout} -o /var/results '
+                    f'--runName {run_name} {" ".join(jobs_options)}'
         )
-        runner_service.add_network(network)
         runner_service.add_volume(result_volume, '/var/results')
 
+        runner_address = 'localhost' if network_mode == NetworkMode.host else runner_service.name
         tool_service = Service(
             name=f'tool-{tool.name}-{thread}',
             image=tool_image,
             user=f'\"{pid}\"',
-            command=f'--ip {runner_service.name} --port 10000 --tool {tool.name} --toolArgs=\'{tool_args}\''
+            command=f'--ip {runner_address} --port {port} --tool {tool.name} --toolArgs=\'{tool_args}\''
         )
-        tool_service.add_network(network)
         tool_service.add_volume(result_volume, '/var/results')
 
+        for service in (runner_service, tool_service):
+            if network_mode == NetworkMode.host:
+                service.network_mode = 'host'
+            else:
+                service.add_network(network)
+
+        if resources is not None:
+            resources.apply(runner_service, tool_service, thread, TOOL_JVMS[tool])
+
         result.add_service(runner_service)
         result.add_service(tool_service)
-        starting_run += thread_runs
 
     return result
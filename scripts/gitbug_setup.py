@@ -1,21 +1,42 @@
 #!/bin/python3
 
+import argparse
 import json
 import logging
+import multiprocessing
 import os
+import re
 import shutil
 import subprocess
 import sys
 import tempfile
 import errno
+import hashlib
 import stat
 import time
+from concurrent.futures import ProcessPoolExecutor
 
+from command_runner import run_command
 from cut_info import cut_map
+from dedup_jars import dedup_jars
+from prune_benchmarks import prune_benchmarks
 
 
 GRADLEW_CMD = '.\gradlew.bat' if sys.platform.startswith('win') else './gradlew'
 MVN_CMD = 'mvn.cmd' if sys.platform.startswith('win') else 'mvn'
+DEFAULT_STEP_TIMEOUT = 60 * 60
+# messages of Maven and Gradle telling that the offline build lacks some dependencies in the cache
+OFFLINE_RESOLUTION_ERRORS = [
+	'offline mode',
+	'Could not resolve',
+	'could not be resolved',
+	'Failed to read artifact descriptor',
+]
+
+# Maven local repository is not safe for concurrent writes, so the online Maven steps that download
+# into the shared build cache are run one at a time; the lock is shared with the worker processes
+# by `init_setup_worker`
+online_build_lock = None
 
 def handle_remove_readonly(func, path, exc):
 	"""
@@ -54,13 +75,100 @@ def handle_remove_readonly(func, path, exc):
 	else:
 		raise
 
-def clone(output_dir, project_json) -> str:
+def get_mirror_dir(mirror_root, repository):
+	return os.path.join(mirror_root, "{}.git".format(repository))
+
+
+def update_mirror(mirror_root, repository, url, commit_ids, log_dir=None, timeout=None):
+	"""
+	Makes sure that the local bare mirror of `repository` contains all the `commit_ids`.
+	The mirror is cloned once and is fetched again only if some of the commits are missing,
+	so re-running the setup with an existing mirror store does not touch the network at all.
+
+	:return: Path to the mirror or None if the mirror could not be created.
+	"""
+	mirror_dir = get_mirror_dir(mirror_root, repository)
+	log_path = os.path.join(log_dir, 'mirrors', "{}.log".format(repository)) if log_dir != None else None
+
+	if os.path.exists(mirror_dir):
+		missing_commits = [
+			commit_id for commit_id in commit_ids
+			if subprocess.run(['git', 'cat-file', '-e', '{}^{{commit}}'.format(commit_id)], cwd=mirror_dir,
+							  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL).returncode != 0
+		]
+		if len(missing_commits) == 0:
+			return mirror_dir
+
+		logging.info("Updating mirror of '{}'".format(repository))
+		result = run_command(['git', 'remote', 'update', '--prune'], cwd=mirror_dir, log_path=log_path, timeout=timeout)
+		if result.returncode != 0:
+			logging.error("Failed to update mirror of '{}': {}".format(repository, result))
+			logging.error("Command error output: {}".format(result.output))
+			return None
+		return mirror_dir
+
+	logging.info("Mirroring repository '{}' from URL '{}'".format(repository, url))
+	os.makedirs(os.path.dirname(mirror_dir), exist_ok=True)
+	result = run_command(['git', 'clone', '--mirror', url, mirror_dir], log_path=log_path, timeout=timeout)
+	if result.returncode != 0:
+		logging.error("Failed to mirror url {}: {}".format(url, result))
+		logging.error("Command error output: {}".format(result.output))
+		if os.path.exists(mirror_dir):
+			shutil.rmtree(mirror_dir, onerror=handle_remove_readonly)
+		return None
+	return mirror_dir
+
+
+def update_mirrors(mirror_root, projects, jobs=1, log_dir=None, timeout=None):
+	"""
+	Fetches every repository referenced by `projects` into the mirror store exactly once.
+
+	:return: Set of repositories which mirrors are available.
+	"""
+	repositories = {}
+	for project_json in projects:
+		url, commit_ids = repositories.setdefault(project_json['repository'], (project_json['clone_url'], []))
+		commit_ids.append(project_json['previous_commit_hash'])
+
+	args = [(mirror_root, repository, url, commit_ids, log_dir, timeout) for repository, (url, commit_ids) in repositories.items()]
+	if jobs > 1:
+		with ProcessPoolExecutor(max_workers=jobs) as executor:
+			mirror_dirs = list(executor.map(update_mirror, *zip(*args)))
+	else:
+		mirror_dirs = [update_mirror(*arg) for arg in args]
+
+	return {repository for repository, mirror_dir in zip(repositories, mirror_dirs) if mirror_dir != None}
+
+
+def shallow_fetch(output_dir, project_dir_name, url, commit_id, log_path=None, timeout=None) -> bool:
+	"""
+	Creates an empty repository in `project_dir_name` and fetches only the `commit_id` into it,
+	without any history and with blobs downloaded lazily on checkout.
+
+	:return: True if the commit was fetched, False if the server refused the request.
+	"""
+	project_dir = os.path.join(output_dir, project_dir_name)
+	commands = [
+		['git', 'init', '--quiet', project_dir],
+		['git', 'remote', 'add', 'origin', url],
+		['git', 'fetch', '--depth', '1', '--filter=blob:none', 'origin', commit_id],
+	]
+	for command in commands:
+		result = run_command(command, cwd=project_dir if os.path.exists(project_dir) else output_dir,
+							 log_path=log_path, timeout=timeout)
+		if result.returncode != 0:
+			logging.info("Single commit fetch of '{}' failed, falling back to full clone: {}".format(project_dir_name, result))
+			if os.path.exists(project_dir):
+				shutil.rmtree(project_dir, onerror=handle_remove_readonly)
+			return False
+	return True
+
+
+def clone(output_dir, project_json, mirror_root=None, log_path=None, timeout=None, shallow=False) -> str:
 	if not os.path.exists(output_dir):
-		os.makedirs(output_dir)
-	os.chdir(output_dir)
-	project_name = project_json['repository'].split('/')[1]
+		os.makedirs(output_dir, exist_ok=True)
 	commit_id = project_json['previous_commit_hash']
-	project_dir_name = "{}-{}".format(project_name, commit_id[0:10])
+	project_dir_name = get_build_id(project_json)
 	project_dir = os.path.join(output_dir, project_dir_name)
 
 	if os.path.exists(project_dir):
@@ -68,35 +176,121 @@ def clone(output_dir, project_json) -> str:
 
 	logging.info("Cloning project '{}' from URL '{}'".format(project_dir_name, project_json['clone_url']))
 
+	if shallow and mirror_root == None:
+		shallow_fetch(output_dir, project_dir_name, project_json['clone_url'], commit_id, log_path, timeout)
+
 	if not os.path.exists(project_dir):
 		url = project_json['clone_url']
-		process = subprocess.Popen(['git', 'clone', url, project_dir_name], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-		cloneOutput, cloneErr = process.communicate()
-		if process.returncode != 0:
+		if mirror_root != None:
+			# local clone that borrows all the objects from the mirror, no network access is required
+			mirror_dir = get_mirror_dir(mirror_root, project_json['repository'])
+			result = run_command(['git', 'clone', '--shared', '--no-checkout', mirror_dir, project_dir_name], cwd=output_dir, log_path=log_path, timeout=timeout)
+		else:
+			result = run_command(['git', 'clone', url, project_dir_name], cwd=output_dir, log_path=log_path, timeout=timeout)
+		if result.returncode == 0 and mirror_root != None:
+			subprocess.run(['git', 'remote', 'set-url', 'origin', url], cwd=project_dir)
+		if result.returncode != 0:
 			logging.error("Failed to clone url {}".format(url))
-			logging.error("Executed command: {}".format(process.args))
-			logging.error("Command error output: {}".format(cloneErr.decode("utf-8")))
+			logging.error("Executed command: {}".format(result))
+			logging.error("Command error output: {}".format(result.output))
 			if os.path.exists(project_dir):
 				shutil.rmtree(project_dir, onerror=handle_remove_readonly)
 			return None
 
-	os.chdir(project_dir)
-	process = subprocess.Popen(['git', 'checkout', commit_id], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-	checkoutOutput, checkoutErr = process.communicate()
-	if process.returncode != 0:
+	result = run_command(['git', 'checkout', commit_id], cwd=project_dir, log_path=log_path, timeout=timeout)
+	if result.returncode != 0:
 		logging.error("Failed to clone checkout commit {}".format(commit_id))
-		logging.error("Command error output: {}".format(checkoutErr.decode("utf-8")))
+		logging.error("Command error output: {}".format(result.output))
 		shutil.rmtree(project_dir, onerror=handle_remove_readonly)
 		return None
 
 	return project_dir
 
-def build(project_json, project_dir, apply_patch):
+def reset_project(project_dir, commit_id, log_path=None, timeout=None) -> bool:
+	"""
+	Brings a project left by a previous setup back to the clean checkout of `commit_id`:
+	the applied bug patch, build outputs, copied dependencies and all the other local changes are removed.
+
+	:return: False if the directory is not a git repository or could not be reset.
+	"""
+	# a directory without its own repository would make git operate on an enclosing one
+	if not os.path.exists(os.path.join(project_dir, '.git')):
+		return False
+	for command in [['git', 'checkout', '--force', commit_id], ['git', 'clean', '-fdx']]:
+		result = run_command(command, cwd=project_dir, log_path=log_path, timeout=timeout)
+		if result.returncode != 0:
+			logging.info("Failed to reset project '{}': {}".format(project_dir, result))
+			return False
+	return True
+
+
+def get_build_env(build_cache):
+	if build_cache == None:
+		return None
+	return dict(os.environ, GRADLE_USER_HOME=os.path.join(build_cache, 'gradle'))
+
+
+def maven_command(goals, build_cache=None):
+	command = [MVN_CMD] + goals
+	if build_cache != None:
+		command.append('-Dmaven.repo.local={}'.format(os.path.join(build_cache, 'm2', 'repository')))
+	return command
+
+
+def gradle_command(tasks, build_cache=None):
+	command = [GRADLEW_CMD] + tasks
+	if build_cache != None:
+		command.append('--build-cache')
+	return command
+
+
+def init_setup_worker(lock):
+	global online_build_lock
+	online_build_lock = lock
+
+
+def is_resolution_error(result):
+	return result.returncode != 0 and not result.timed_out and \
+		any(error in result.output for error in OFFLINE_RESOLUTION_ERRORS)
+
+
+def run_build_command(command, project_dir, build_cache=None, offline_flag=None, log_path=None, timeout=None,
+					  resolve_command=None):
+	"""
+	Runs a single build command in `project_dir`. In the build cache mode the command is first tried
+	with `offline_flag`, so projects which dependencies are already in the shared cache do not touch
+	the network at all, and it is re-run online only if the offline attempt fails to resolve the dependencies.
+	If `resolve_command` is set and the setup runs in parallel, only this command is run online, waiting for the other
+	online steps that write into the cache, and the build itself is retried offline in parallel with the others.
+	The build is run online under the lock only if the dependencies are still missing after that.
+
+	:return: `CommandResult` of the last attempt.
+	"""
+	env = get_build_env(build_cache)
+	if build_cache != None and offline_flag != None:
+		result = run_command(command + [offline_flag], cwd=project_dir, env=env, log_path=log_path, timeout=timeout)
+		if not is_resolution_error(result):
+			return result
+		logging.info("Offline build step of '{}' lacks dependencies, retrying online".format(project_dir))
+
+	if build_cache != None and resolve_command != None and online_build_lock != None:
+		with online_build_lock:
+			result = run_command(resolve_command, cwd=project_dir, env=env, log_path=log_path, timeout=timeout)
+		if result.returncode == 0 and offline_flag != None:
+			result = run_command(command + [offline_flag], cwd=project_dir, env=env, log_path=log_path, timeout=timeout)
+			if not is_resolution_error(result):
+				return result
+		logging.info("Dependencies of '{}' are not fully resolved, building it online".format(project_dir))
+		with online_build_lock:
+			return run_command(command, cwd=project_dir, env=env, log_path=log_path, timeout=timeout)
+	return run_command(command, cwd=project_dir, env=env, log_path=log_path, timeout=timeout)
+
+
+def build(project_json, project_dir, apply_patch, build_cache=None, log_path=None, timeout=None):
 	if not os.path.exists(project_dir):
 		return None
 
 	logging.info("Building the project '{}'".format(project_dir))
-	os.chdir(project_dir)
 
 	if apply_patch:
 		logging.info("Applying bug patch")
@@ -107,9 +301,8 @@ def build(project_json, project_dir, apply_patch):
 			f.write(patch)
 
 		logging.info(f'Patch temporarily written to {tmp.name}')
-		p = subprocess.Popen(['git', 'apply', tmp.name])
-		_, _ = p.communicate()
-		if p.returncode == 0:
+		result = run_command(['git', 'apply', tmp.name], cwd=project_dir, log_path=log_path, timeout=timeout)
+		if result.returncode == 0:
 			logging.info('Patch successfully applied')
 		else:
 			logging.error('Failed to successfully apply patch')
@@ -125,43 +318,42 @@ def build(project_json, project_dir, apply_patch):
 	logging.info("Detected build system: {}".format(build_system))
 
 	if build_system == 'maven':
+		maven_goals = ['clean', 'package', '-DskipTests']
+		if build_cache != None:
+			# copy the dependencies in the same invocation instead of starting one more cold Maven
+			maven_goals.append('dependency:copy-dependencies')
 		try:
-			process = subprocess.Popen([MVN_CMD, 'clean', 'package', '-DskipTests'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+			result = run_build_command(maven_command(maven_goals, build_cache), project_dir, build_cache, '-o', log_path, timeout,
+									   resolve_command=maven_command(['dependency:go-offline'], build_cache))
 		except FileNotFoundError:
 			logging.error("Failed to find Maven executable at location '{}'. Check your Maven PATH variable.".format(MVN_CMD))
 			shutil.rmtree(project_dir, onerror=handle_remove_readonly)
 			raise
-		output, err = process.communicate()
-		if process.returncode != 0:
+		if result.returncode != 0:
 			logging.error("Failed to build maven project {}".format(project_dir))
-			logging.error("Build command: {}".format(process.args))
-			logging.error("Build error output: {}".format(err.decode("utf-8")))
-			if err == b"":
-				logging.error("Build process output: {}".format(output.decode("utf-8")))
+			logging.error("Build command: {}".format(result))
+			logging.error("Build process output: {}".format(result.output))
 			shutil.rmtree(project_dir, onerror=handle_remove_readonly)
 			return None
 
-		process = subprocess.Popen([MVN_CMD, 'dependency:copy-dependencies'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-		_, _ = process.communicate()
-		if process.returncode != 0:
-			logging.error("Failed to copy maven dependencies {}".format(project_dir))
-			shutil.rmtree(project_dir, onerror=handle_remove_readonly)
-			return None
+		if build_cache == None:
+			result = run_command([MVN_CMD, 'dependency:copy-dependencies'], cwd=project_dir, log_path=log_path, timeout=timeout)
+			if result.returncode != 0:
+				logging.error("Failed to copy maven dependencies {}".format(project_dir))
+				shutil.rmtree(project_dir, onerror=handle_remove_readonly)
+				return None
 
 	elif build_system == 'gradle-kotlin' or build_system == 'gradle-groovy':
 		try:
-			process = subprocess.Popen([GRADLEW_CMD, 'build', '-x', 'test'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+			result = run_build_command(gradle_command(['build', '-x', 'test'], build_cache), project_dir, build_cache, '--offline', log_path, timeout)
 		except FileNotFoundError:
 			logging.error("Failed to find Gradlew executable at location '{}'.".format(GRADLEW_CMD))
 			shutil.rmtree(project_dir, onerror=handle_remove_readonly)
 			raise
-		output, err = process.communicate()
-		if process.returncode != 0:
+		if result.returncode != 0:
 			logging.error("Failed to build kotlin gradle project {}".format(project_dir))
-			logging.error("Build command: {}".format(process.args))
-			logging.error("Build error output: {}".format(err.decode("utf-8", errors="replace")))
-			if err == b"":
-				logging.error("Build process output: {}".format(output.decode("utf-8")))
+			logging.error("Build command: {}".format(result))
+			logging.error("Build process output: {}".format(result.output))
 			shutil.rmtree(project_dir, onerror=handle_remove_readonly)
 			return None
 
@@ -181,115 +373,326 @@ task copyDependencies(type: Copy) {
 }
 	"""
 
-		process = subprocess.Popen([GRADLEW_CMD, 'copyDependencies'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-		output, err = process.communicate()
-		if process.returncode != 0:
+		result = run_build_command(gradle_command(['copyDependencies'], build_cache), project_dir, build_cache, '--offline', log_path, timeout)
+		if result.returncode != 0:
 			build_file = open(build_file_path, "a")
 			build_file.write(build_file_patch)
 			build_file.close()
 
-			process = subprocess.Popen([GRADLEW_CMD, 'copyDependencies'], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-			output, err = process.communicate()
-			if process.returncode != 0:
+			result = run_build_command(gradle_command(['copyDependencies'], build_cache), project_dir, build_cache, '--offline', log_path, timeout)
+			if result.returncode != 0:
 				logging.error("Failed to copy gradle dependencies {}".format(project_dir))
-				logging.error("Build command: {}".format(process.args))
-				logging.error("Build error output: {}".format(err.decode("utf-8")))
+				logging.error("Build command: {}".format(result))
+				logging.error("Build process output: {}".format(result.output))
 				shutil.rmtree(project_dir, onerror=handle_remove_readonly)
 				return None
 
 	return project_dir
 
 
-def download_projects(gitbug_data_dir, output_dir, apply_patch):
-	downloaded_projects = []
+def get_build_id(project_json):
+	project_name = project_json['repository'].split('/')[1]
+	commit_id = project_json['previous_commit_hash']
+	return "{}-{}".format(project_name, commit_id[0:10])
+
+
+def read_projects(gitbug_data_dir):
+	"""
+	Streams GitBug entries from all the JSONL files in `gitbug_data_dir` one line at a time.
+	"""
 	for file in os.listdir(gitbug_data_dir):
 		project_json = os.path.join(gitbug_data_dir, file)
-		for json_Str in open(project_json).read().removesuffix('\n').split('\n'):
-			json_Str = json_Str.translate(str.maketrans({"\n": r"\\n"}))
-			project_data = json.loads(json_Str)
+		with open(project_json) as f:
+			for json_Str in f:
+				json_Str = json_Str.removesuffix('\n')
+				if json_Str == '':
+					continue
+				yield json.loads(json_Str)
 
-			project_dir = clone(output_dir, project_data)
-			if project_dir == None:
-				continue
 
-			project_dir = build(project_data, project_dir, apply_patch)
-			if project_dir == None:
-				continue
+def select_projects(projects, include=None, exclude=None, include_regex=None, exclude_regex=None):
+	"""
+	Keeps only the GitBug entries that will end up in the `benchmarks.json`, i.e. the ones that have a CUT
+	in the `cut_map`, and then additionally filters them by their build ids.
+
+	:param projects: Iterable of GitBug entries.
+	:param include: Collection of build ids to keep, all the entries are kept if it is None.
+	:param exclude: Collection of build ids to skip.
+	:param include_regex: Regex that build id of a kept entry should match.
+	:param exclude_regex: Regex that build id of a kept entry should not match.
+	:return: List of selected entries.
+	"""
+	include_pattern = re.compile(include_regex) if include_regex != None else None
+	exclude_pattern = re.compile(exclude_regex) if exclude_regex != None else None
+
+	selected = []
+	skipped = 0
+	for project_json in projects:
+		build_id = get_build_id(project_json)
+		if (build_id not in cut_map
+				or (include != None and build_id not in include)
+				or (exclude != None and build_id in exclude)
+				or (include_pattern != None and not include_pattern.search(build_id))
+				or (exclude_pattern != None and exclude_pattern.search(build_id))):
+			skipped += 1
+			continue
+		selected.append(project_json)
 
-			downloaded_projects.append([project_data, project_dir])
-	return downloaded_projects
+	logging.info("Selected {} projects, skipped {} projects".format(len(selected), skipped))
+	return selected
 
 
-def produce_benchmarks(downloaded_projects):
-	benchmarks = []
-	for project_json, project_dir in downloaded_projects:
-		benchmark = {}
-		benchmark['name'] = project_json['repository'].split('/')[1]
-		benchmark['root'] = project_dir
-		benchmark['build_id'] = project_dir.split(os.path.sep)[-1]
-
-		src_path = project_dir
-		bin_path = ''
-		class_path = []
-
-		for word in ['src', 'main', 'java']:
-			if os.path.exists(os.path.join(src_path, word)):
-				src_path = os.path.join(src_path, word)
-
-		if not src_path:
-			logging.error("Could not find src path of project {}".format(project_dir))
-			continue
+MANIFEST_FILE = 'setup-manifest.json'
+BUILD_SYSTEM_FILES = [
+	'pom.xml',
+	'build.gradle',
+	'build.gradle.kts',
+	'settings.gradle',
+	'settings.gradle.kts',
+	'gradle.properties',
+	'gradle/wrapper/gradle-wrapper.properties',
+]
 
-		if os.path.exists(os.path.join(project_dir, 'target')):
-			target_dir_path = os.path.join(project_dir, 'target')
-
-			classes_dir_path = os.path.join(target_dir_path, 'classes')
-			if os.path.exists(classes_dir_path):
-				bin_path = classes_dir_path
-				class_path.append(classes_dir_path)
-
-			dependency_dir = ''
-			if os.path.exists(os.path.join(target_dir_path, 'dependency')):
-				dependency_dir = os.path.join(target_dir_path, 'dependency')
-			elif os.path.exists(os.path.join(target_dir_path, 'dependencies')):
-				dependency_dir = os.path.join(target_dir_path, 'dependencies')
-			elif os.path.exists(os.path.join(target_dir_path, 'lib')):
-				dependency_dir = os.path.join(target_dir_path, 'lib')
-
-			if os.path.exists(dependency_dir):
-				for file in os.listdir(dependency_dir):
-					class_path.append(os.path.join(dependency_dir, file))
-		if os.path.exists(os.path.join(project_dir, 'build')):
-			build_dir_path = os.path.join(project_dir, 'build')
-			classes_dir_path = os.path.join(build_dir_path, 'classes')
-			if os.path.exists(os.path.join(classes_dir_path, 'java')):
-				classes_dir_path = os.path.join(classes_dir_path, 'java')
-			if os.path.exists(os.path.join(classes_dir_path, 'kotlin')):
-				classes_dir_path = os.path.join(classes_dir_path, 'kotlin')
-			if os.path.exists(os.path.join(classes_dir_path, 'main')):
-				classes_dir_path = os.path.join(classes_dir_path, 'main')
-			bin_path = classes_dir_path
 
-			class_path.append(classes_dir_path)
+def get_build_files(project_dir):
+	"""
+	Lists build system files of the checked out commit together with their git blob ids,
+	so local modifications made by `build()` do not affect the result.
+	"""
+	process = subprocess.Popen(['git', 'ls-tree', 'HEAD', '--'] + BUILD_SYSTEM_FILES, cwd=project_dir, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+	build_files, _ = process.communicate()
+	return build_files.decode("utf-8")
 
-			dependency_dir = ''
-			if os.path.exists(os.path.join(project_dir, 'dependencies')):
-				dependency_dir = os.path.join(project_dir, 'dependencies')
 
-			if os.path.exists(dependency_dir):
-				for file in os.listdir(dependency_dir):
-					if file.endswith('.zip'):
-						continue
-					class_path.append(os.path.join(dependency_dir, file))
+def get_manifest_key(project_json, build_files, apply_patch):
+	"""
+	Computes a hash of all the inputs of the project build: repository, commit, bug patch,
+	build system files and `apply_patch` flag.
+	"""
+	key = {
+		'repository': project_json['repository'],
+		'commit': project_json['previous_commit_hash'],
+		'bug_patch': hashlib.sha256(project_json['bug_patch'].encode("utf-8")).hexdigest(),
+		'build_files': build_files,
+		'apply_patch': apply_patch,
+	}
+	return hashlib.sha256(json.dumps(key, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def read_manifest(output_dir):
+	manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+	if not os.path.exists(manifest_path):
+		return {}
+	with open(manifest_path) as manifest_file:
+		return json.load(manifest_file)
+
+
+def write_manifest(output_dir, manifest):
+	manifest_path = os.path.join(output_dir, MANIFEST_FILE)
+	with open(manifest_path, "w") as manifest_file:
+		manifest_file.write(json.dumps(manifest, indent = 2))
+
+
+def is_up_to_date(manifest_entry, key):
+	if manifest_entry == None or manifest_entry['key'] != key:
+		return False
+	benchmark = manifest_entry['benchmark']
+	return os.path.exists(benchmark['bin']) and all(os.path.exists(path) for path in benchmark['classPath'])
+
+
+class SetupConfig:
+	def __init__(self, output_dir, apply_patch, jobs=1, mirror_root=None, build_cache=None, log_dir=None,
+				 step_timeout=DEFAULT_STEP_TIMEOUT, shallow=False):
+		self.output_dir = output_dir
+		self.apply_patch = apply_patch
+		self.jobs = jobs
+		self.mirror_root = mirror_root
+		self.build_cache = build_cache
+		self.log_dir = log_dir
+		self.step_timeout = step_timeout
+		self.shallow = shallow
+
+	def get_log_path(self, build_id):
+		if self.log_dir == None:
+			return None
+		return os.path.join(self.log_dir, "{}.log".format(build_id))
+
+
+def log_setup_failure(project_data, log_path):
+	if log_path != None:
+		logging.error("Failed to set up project '{}', full output is available in '{}'".format(get_build_id(project_data), log_path))
+
+
+def setup_project(project_data, config, mirror_root=None, manifest_entry=None):
+	"""
+	Clones and builds a single project. Works only with paths derived from `config.output_dir`
+	and does not change the working directory of the process, so it is safe to run
+	several instances of it concurrently in a process pool.
 
-		benchmark['src'] = src_path
-		benchmark['bin'] = bin_path
-		benchmark['classPath'] = class_path
+	If `manifest_entry` was recorded for the same build inputs and its outputs still exist,
+	the build is skipped and the recorded benchmark is reused. Otherwise, the project tree left by
+	the previous setup is reset to the clean commit before it is rebuilt.
+
+	:return: New manifest entry of the project or None if cloning or building failed.
+	"""
+	log_path = config.get_log_path(get_build_id(project_data))
+	existed = os.path.exists(os.path.join(config.output_dir, get_build_id(project_data)))
+	project_dir = clone(config.output_dir, project_data, mirror_root, log_path, config.step_timeout, config.shallow)
+	if project_dir == None:
+		log_setup_failure(project_data, log_path)
+		return None
+
+	# pruned projects do not have a git repository anymore, so the recorded build files are used
+	pruned = manifest_entry != None and manifest_entry.get('pruned', False)
+	build_files = manifest_entry['build_files'] if pruned else get_build_files(project_dir)
+	key = get_manifest_key(project_data, build_files, config.apply_patch)
+	if is_up_to_date(manifest_entry, key):
+		logging.info("Project '{}' is up to date, skipping the build".format(project_dir))
+		benchmark = manifest_entry['benchmark']
 		benchmark['klass'] = cut_map[benchmark['build_id']]
+		manifest_entry['build_files'] = build_files
+		return manifest_entry
+
+	# the tree left by the previous setup may have the old bug patch applied and stale build outputs,
+	# so it is reset to the clean commit, or cloned again if it is not a working repository anymore
+	commit_id = project_data['previous_commit_hash']
+	if existed and not pruned and reset_project(project_dir, commit_id, log_path, config.step_timeout):
+		build_files = get_build_files(project_dir)
+		key = get_manifest_key(project_data, build_files, config.apply_patch)
+	elif existed:
+		if pruned:
+			logging.info("Project '{}' was pruned and cannot be rebuilt in place, cloning it again".format(project_dir))
+		else:
+			logging.info("Project '{}' cannot be reset, cloning it again".format(project_dir))
+		shutil.rmtree(project_dir, onerror=handle_remove_readonly)
+		project_dir = clone(config.output_dir, project_data, mirror_root, log_path, config.step_timeout, config.shallow)
+		if project_dir == None:
+			log_setup_failure(project_data, log_path)
+			return None
+		build_files = get_build_files(project_dir)
+		key = get_manifest_key(project_data, build_files, config.apply_patch)
+
+	project_dir = build(project_data, project_dir, config.apply_patch, config.build_cache, log_path, config.step_timeout)
+	if project_dir == None:
+		log_setup_failure(project_data, log_path)
+		return None
 
-		benchmarks.append(benchmark)
+	benchmark = produce_benchmark(project_data, project_dir)
+	if benchmark == None:
+		return None
+	return {'key': key, 'build_files': build_files, 'benchmark': benchmark}
+
+
+def download_projects(projects, config, manifest=None):
+	"""
+	Sets up all the `projects` and updates the `manifest` with their new entries.
+
+	:return: List of the produced benchmarks, in the same order as `projects`.
+	"""
+	if manifest == None:
+		manifest = {}
+
+	mirror_roots = [None] * len(projects)
+	if config.mirror_root != None:
+		mirrored = update_mirrors(config.mirror_root, projects, config.jobs, config.log_dir, config.step_timeout)
+		mirror_roots = [config.mirror_root if project_data['repository'] in mirrored else None for project_data in projects]
+
+	manifest_entries = [manifest.get(get_build_id(project_data)) for project_data in projects]
+
+	if config.jobs > 1:
+		logging.info("Setting up {} projects using {} parallel jobs".format(len(projects), config.jobs))
+		with ProcessPoolExecutor(max_workers=config.jobs, initializer=init_setup_worker,
+								 initargs=(multiprocessing.Lock(),)) as executor:
+			futures = [
+				executor.submit(setup_project, project_data, config, project_mirror_root, manifest_entry)
+				for project_data, project_mirror_root, manifest_entry in zip(projects, mirror_roots, manifest_entries)
+			]
+			# results are collected in submission order, so the produced benchmarks
+			# are ordered exactly as in the sequential run
+			manifest_entries = [future.result() for future in futures]
+	else:
+		manifest_entries = [
+			setup_project(project_data, config, project_mirror_root, manifest_entry)
+			for project_data, project_mirror_root, manifest_entry in zip(projects, mirror_roots, manifest_entries)
+		]
+
+	benchmarks = []
+	for project_data, manifest_entry in zip(projects, manifest_entries):
+		build_id = get_build_id(project_data)
+		if manifest_entry == None:
+			manifest.pop(build_id, None)
+			continue
+		manifest[build_id] = manifest_entry
+		benchmarks.append(manifest_entry['benchmark'])
 	return benchmarks
 
+
+def produce_benchmark(project_json, project_dir):
+	benchmark = {}
+	benchmark['name'] = project_json['repository'].split('/')[1]
+	benchmark['root'] = project_dir
+	benchmark['build_id'] = project_dir.split(os.path.sep)[-1]
+
+	src_path = project_dir
+	bin_path = ''
+	class_path = []
+
+	for word in ['src', 'main', 'java']:
+		if os.path.exists(os.path.join(src_path, word)):
+			src_path = os.path.join(src_path, word)
+
+	if not src_path:
+		logging.error("Could not find src path of project {}".format(project_dir))
+		return None
+
+	if os.path.exists(os.path.join(project_dir, 'target')):
+		target_dir_path = os.path.join(project_dir, 'target')
+
+		classes_dir_path = os.path.join(target_dir_path, 'classes')
+		if os.path.exists(classes_dir_path):
+			bin_path = classes_dir_path
+			class_path.append(classes_dir_path)
+
+		dependency_dir = ''
+		if os.path.exists(os.path.join(target_dir_path, 'dependency')):
+			dependency_dir = os.path.join(target_dir_path, 'dependency')
+		elif os.path.exists(os.path.join(target_dir_path, 'dependencies')):
+			dependency_dir = os.path.join(target_dir_path, 'dependencies')
+		elif os.path.exists(os.path.join(target_dir_path, 'lib')):
+			dependency_dir = os.path.join(target_dir_path, 'lib')
+
+		if os.path.exists(dependency_dir):
+			for file in os.listdir(dependency_dir):
+				class_path.append(os.path.join(dependency_dir, file))
+	if os.path.exists(os.path.join(project_dir, 'build')):
+		build_dir_path = os.path.join(project_dir, 'build')
+		classes_dir_path = os.path.join(build_dir_path, 'classes')
+		if os.path.exists(os.path.join(classes_dir_path, 'java')):
+			classes_dir_path = os.path.join(classes_dir_path, 'java')
+		if os.path.exists(os.path.join(classes_dir_path, 'kotlin')):
+			classes_dir_path = os.path.join(classes_dir_path, 'kotlin')
+		if os.path.exists(os.path.join(classes_dir_path, 'main')):
+			classes_dir_path = os.path.join(classes_dir_path, 'main')
+		bin_path = classes_dir_path
+
+		class_path.append(classes_dir_path)
+
+		dependency_dir = ''
+		if os.path.exists(os.path.join(project_dir, 'dependencies')):
+			dependency_dir = os.path.join(project_dir, 'dependencies')
+
+		if os.path.exists(dependency_dir):
+			for file in os.listdir(dependency_dir):
+				if file.endswith('.zip'):
+					continue
+				class_path.append(os.path.join(dependency_dir, file))
+
+	benchmark['src'] = src_path
+	benchmark['bin'] = bin_path
+	benchmark['classPath'] = class_path
+	benchmark['klass'] = cut_map[benchmark['build_id']]
+	return benchmark
+
 def main():
 	logging.basicConfig(
 		handlers=[
@@ -300,18 +703,81 @@ def main():
 		level=logging.INFO
 	)
 
-	if len(sys.argv) < 4:
-		logging.error("Usage: `./gutbug_setup.py *path to GitBug root* *path to output dir* *apply patches*`")
+	parser = argparse.ArgumentParser(description="GitBug benchmarks setup")
+	parser.add_argument("gitbug_root", type=str, help="Path to GitBug root")
+	parser.add_argument("output_dir", type=str, help="Path to output dir")
+	parser.add_argument("apply_patch", type=str, help="Apply bug patches, 'True' or 'False'")
+	parser.add_argument("--jobs", type=int, default=1,
+						help="Number of projects to clone and build in parallel, default is 1")
+	parser.add_argument("--mirror-dir", type=str, default=None,
+						help="Path to a store of bare repository mirrors, each repository is fetched only once "
+							 "and every project is cloned from the local mirror")
+	parser.add_argument("--shallow", action='store_true',
+						help="Fetch only the required commit of each project, without history and with blobs "
+							 "downloaded on checkout, falls back to full clone if the server refuses the request; "
+							 "ignored for the mirrored repositories")
+	parser.add_argument("--include", type=str, nargs='+', default=None,
+						help="Build ids of the projects to set up, by default all the projects from the CUT map are set up")
+	parser.add_argument("--exclude", type=str, nargs='+', default=None,
+						help="Build ids of the projects to skip")
+	parser.add_argument("--include-regex", type=str, default=None,
+						help="Set up only the projects which build ids match the regex")
+	parser.add_argument("--exclude-regex", type=str, default=None,
+						help="Skip the projects which build ids match the regex")
+	parser.add_argument("--force-rebuild", action='store_true',
+						help="Ignore the setup manifest of the previous runs and rebuild all the projects")
+	parser.add_argument("--build-cache", type=str, default=None,
+						help="Path to a shared Maven repository and Gradle home used by all the project builds, "
+							 "builds are run offline whenever all the dependencies are already cached")
+	parser.add_argument("--log-dir", type=str, default=None,
+						help="Path to the dir with per-project build logs, default is *output dir*/logs")
+	parser.add_argument("--step-timeout", type=int, default=DEFAULT_STEP_TIMEOUT,
+						help="Timeout in seconds for each clone or build step of a project, 0 disables the timeout, "
+							 "default is {}".format(DEFAULT_STEP_TIMEOUT))
+	parser.add_argument("--dedup-jars", type=str, default=None,
+						help="Path to a content-addressed store, dependency jars of all the benchmarks are moved "
+							 "into it and hard-linked back, so identical jars are stored only once")
+	parser.add_argument("--prune", action='store_true',
+						help="Remove everything the pipeline does not use from the built projects (git history, "
+							 "build outputs except compiled classes, etc.) and validate the result")
+	args = parser.parse_args()
+
+	if args.jobs < 1:
+		logging.error("Number of jobs should be positive, got {}".format(args.jobs))
 		sys.exit(1)
 
-	gitbug_data_dir = os.path.join(sys.argv[1], 'data/bugs/')
-	output_dir = sys.argv[2]
-	apply_patch = (sys.argv[3] == 'True')
+	gitbug_data_dir = os.path.join(args.gitbug_root, 'data/bugs/')
+	output_dir = os.path.abspath(args.output_dir)
+	apply_patch = (args.apply_patch == 'True')
+	config = SetupConfig(
+		output_dir=output_dir,
+		apply_patch=apply_patch,
+		jobs=args.jobs,
+		mirror_root=os.path.abspath(args.mirror_dir) if args.mirror_dir != None else None,
+		build_cache=os.path.abspath(args.build_cache) if args.build_cache != None else None,
+		log_dir=os.path.abspath(args.log_dir) if args.log_dir != None else os.path.join(output_dir, 'logs'),
+		step_timeout=args.step_timeout if args.step_timeout > 0 else None,
+		shallow=args.shallow,
+	)
 
 	logging.info("Detected operating system: {}, therefore will use {} and {} to execute gradle and maven tasks when building projects."
 				 .format(sys.platform, GRADLEW_CMD, MVN_CMD))
-	downloaded_projects = download_projects(gitbug_data_dir, output_dir, apply_patch)
-	benchmarks = produce_benchmarks(downloaded_projects)
+	projects = select_projects(read_projects(gitbug_data_dir), args.include, args.exclude,
+							   args.include_regex, args.exclude_regex)
+	manifest = read_manifest(output_dir) if not args.force_rebuild else {}
+	benchmarks = download_projects(projects, config, manifest)
+	if args.dedup_jars != None:
+		stats = dedup_jars(benchmarks, os.path.abspath(args.dedup_jars), args.jobs)
+		logging.info("Deduplicated dependency jars: {}".format(stats))
+	if args.prune:
+		pruned, broken = prune_benchmarks(benchmarks)
+		# skipped and already pruned benchmarks keep their flags, so an intact tree can still be rebuilt in place
+		for benchmark in pruned:
+			manifest[benchmark['build_id']]['pruned'] = True
+		for benchmark in broken:
+			manifest.pop(benchmark['build_id'])
+			benchmarks.remove(benchmark)
+	write_manifest(output_dir, manifest)
 
 	output_file_path = os.path.join(output_dir, 'benchmarks.json')
 	output_file = open(output_file_path, "w")
@@ -0,0 +1,283 @@
+#!/bin/python3
+import argparse
+import json
+import logging
+import os
+import sqlite3
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+from generate_compose import Tool
+
+DATABASE_NAME = 'results.sqlite'
+# paths inside the result files are the ones of the results volume of the containers
+RESULTS_MOUNT = '/var/results'
+# analysis writes the failures of the generated tests into the test sources folder
+FAILURES_FILE = 'failures.json'
+PATCHED_FAILURES_FILE = 'failures-patched.json'
+BATCH_SIZE = 1000
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS run_dirs (
+    tool TEXT NOT NULL,
+    name TEXT NOT NULL,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (tool, name)
+);
+CREATE TABLE IF NOT EXISTS results (
+    tool TEXT NOT NULL,
+    run_name TEXT NOT NULL,
+    iteration INTEGER NOT NULL,
+    build_id TEXT NOT NULL,
+    klass TEXT,
+    complete INTEGER NOT NULL,
+    generation_time REAL,
+    size INTEGER NOT NULL,
+    files INTEGER NOT NULL,
+    tests INTEGER,
+    test_src_path TEXT,
+    failures INTEGER,
+    patched_failures INTEGER,
+    mtime REAL NOT NULL,
+    PRIMARY KEY (tool, run_name, iteration, build_id)
+);
+CREATE INDEX IF NOT EXISTS results_run ON results (tool, run_name);
+CREATE INDEX IF NOT EXISTS results_build_id ON results (build_id);
+'''
+COLUMNS = ['tool', 'run_name', 'iteration', 'build_id', 'klass', 'complete', 'generation_time', 'size', 'files',
+           'tests', 'test_src_path', 'failures', 'patched_failures', 'mtime']
+
+
+class IndexStats:
+    def __init__(self):
+        self.run_dirs = 0
+        self.skipped_run_dirs = 0
+        self.indexed = 0
+        self.removed = 0
+        self.deferred = 0
+
+    def __str__(self):
+        return (f'{self.run_dirs} run folders, {self.skipped_run_dirs} of them unchanged, '
+                f'{self.indexed} results indexed, {self.removed} removed, {self.deferred} left for the next indexing')
+
+
+def parse_run_dir_name(name: str) -> Optional[tuple[str, int]]:
+    run_name, _, iteration = name.rpartition('-')
+    if not run_name or not iteration.isdigit():
+        return None
+    return run_name, int(iteration)
+
+
+def result_mtime(result_dir: str) -> float:
+    """
+    Changes when the result is written or completed: the tools write into the result folder,
+    and `testSuite.json` is written by the runner at the end.
+    """
+    mtime = os.path.getmtime(result_dir)
+    try:
+        return max(mtime, os.path.getmtime(os.path.join(result_dir, 'testSuite.json')))
+    except FileNotFoundError:
+        return mtime
+
+
+def to_host_path(path: str, results_path: str) -> str:
+    if path == RESULTS_MOUNT or path.startswith(RESULTS_MOUNT + '/'):
+        return os.path.join(results_path, os.path.relpath(path, RESULTS_MOUNT))
+    return path
+
+
+def count_failures(path: str) -> Optional[int]:
+    try:
+        with open(path) as file:
+            return len(json.load(file))
+    except (OSError, ValueError):
+        return None
+
+
+def read_result(results_path: str, tool: str, run_name: str, iteration: int, result_dir: str) -> Optional[tuple]:
+    """
+    Reads a single result folder into a row of `results` table.
+
+    :return: None if the result folder has disappeared or cannot be read, e.g. it is being replaced by a running tool.
+    """
+    try:
+        mtime = result_mtime(result_dir)
+    except OSError as e:
+        logging.warning(f'Could not read result {result_dir}, it is left for the next indexing: {e}')
+        return None
+    size = 0
+    files = 0
+    start = None
+    for dir_path, dir_names, file_names in os.walk(result_dir):
+        for name in dir_names + file_names:
+            # tools may delete their temporary files while the result is being read
+            try:
+                stat = os.lstat(os.path.join(dir_path, name))
+            except OSError:
+                continue
+            start = stat.st_mtime if start is None else min(start, stat.st_mtime)
+            if name in file_names:
+                size += stat.st_size
+                files += 1
+
+    klass = None
+    try:
+        with open(os.path.join(result_dir, 'benchmark.json')) as file:
+            klass = json.load(file).get('klass')
+    except (OSError, ValueError):
+        pass
+
+    complete = False
+    generation_time = None
+    tests = None
+    test_src_path = None
+    failures = None
+    patched_failures = None
+    try:
+        with open(os.path.join(result_dir, 'testSuite.json')) as file:
+            test_suite = json.load(file)
+        complete = klass is not None
+        # same approximation as `planning.measured_generation_time`
+        generation_time = os.path.getmtime(os.path.join(result_dir, 'testSuite.json')) - start
+        tests = len(test_suite['tests'])
+        test_src_path = to_host_path(test_suite['testSrcPath'], results_path)
+        failures = count_failures(os.path.join(test_src_path, FAILURES_FILE))
+        patched_failures = count_failures(os.path.join(test_src_path, PATCHED_FAILURES_FILE))
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    return (tool, run_name, iteration, os.path.basename(result_dir), klass, int(complete), generation_time,
+            size, files, tests, test_src_path, failures, patched_failures, mtime)
+
+
+def open_database(path: str) -> sqlite3.Connection:
+    connection = sqlite3.connect(path)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.executescript(SCHEMA)
+    return connection
+
+
+def index_results(results_path: str, connection: sqlite3.Connection, jobs: int = 1, full: bool = False) -> IndexStats:
+    """
+    Indexes the results of all the tools in `results_path` into the `results` table.
+    Only the new data is read: a run folder is listed again only if its modification time has changed,
+    otherwise only its incomplete results are checked, and a result is read again only if it has changed.
+    If `full` is set, everything is read again, e.g. after the analysis has written the failures of the tests.
+    """
+    stats = IndexStats()
+    known_run_dirs = {(tool, name): mtime for tool, name, mtime in connection.execute('SELECT * FROM run_dirs')}
+    seen_run_dirs = set()
+    to_read = []
+    removed = []
+    run_dir_mtimes = {}
+    deferred_run_dirs = set()
+
+    for tool in Tool:
+        tool_dir = os.path.join(results_path, tool.value)
+        if not os.path.isdir(tool_dir):
+            continue
+        for run_dir in os.scandir(tool_dir):
+            parsed = parse_run_dir_name(run_dir.name)
+            if parsed is None or not run_dir.is_dir():
+                continue
+            run_name, iteration = parsed
+            stats.run_dirs += 1
+            key = (tool.value, run_dir.name)
+            seen_run_dirs.add(key)
+            indexed = {
+                build_id: (mtime, complete) for build_id, mtime, complete in connection.execute(
+                    'SELECT build_id, mtime, complete FROM results WHERE tool = ? AND run_name = ? AND iteration = ?',
+                    (tool.value, run_name, iteration)
+                )
+            }
+
+            # modification time is read before the listing, so the entries added meanwhile are seen next time
+            try:
+                mtime = run_dir.stat().st_mtime
+                if not full and known_run_dirs.get(key) == mtime:
+                    stats.skipped_run_dirs += 1
+                    build_ids = [build_id for build_id, (_, complete) in indexed.items() if not complete]
+                else:
+                    build_ids = [entry.name for entry in os.scandir(run_dir.path) if entry.is_dir()]
+                    removed += [(tool.value, run_name, iteration, build_id)
+                                for build_id in indexed.keys() - set(build_ids)]
+                    run_dir_mtimes[key] = mtime
+            except OSError as e:
+                # the run folder is being moved or removed, it is indexed next time
+                logging.warning(f'Could not list {run_dir.path}, it is left for the next indexing: {e}')
+                continue
+
+            for build_id in build_ids:
+                result_dir = os.path.join(run_dir.path, build_id)
+                try:
+                    if not os.path.isdir(result_dir):
+                        removed.append((tool.value, run_name, iteration, build_id))
+                    elif full or build_id not in indexed or indexed[build_id][0] != result_mtime(result_dir):
+                        to_read.append((key, (tool.value, run_name, iteration, result_dir)))
+                except OSError:
+                    to_read.append((key, (tool.value, run_name, iteration, result_dir)))
+
+    for tool, name in known_run_dirs.keys() - seen_run_dirs:
+        run_name, iteration = parse_run_dir_name(name)
+        stats.removed += connection.execute('DELETE FROM results WHERE tool = ? AND run_name = ? AND iteration = ?',
+                                            (tool, run_name, iteration)).rowcount
+        connection.execute('DELETE FROM run_dirs WHERE tool = ? AND name = ?', (tool, name))
+    connection.executemany(
+        'DELETE FROM results WHERE tool = ? AND run_name = ? AND iteration = ? AND build_id = ?', removed
+    )
+    stats.removed += len(removed)
+
+    insert = f'INSERT OR REPLACE INTO results ({", ".join(COLUMNS)}) VALUES ({", ".join("?" * len(COLUMNS))})'
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        rows = executor.map(lambda args: read_result(results_path, *args[1]), to_read)
+        batch = []
+        for (key, _), row in zip(to_read, rows):
+            if row is None:
+                deferred_run_dirs.add(key)
+                stats.deferred += 1
+                continue
+            batch.append(row)
+            if len(batch) == BATCH_SIZE:
+                connection.executemany(insert, batch)
+                connection.commit()
+                logging.info(f'Indexed {stats.indexed + len(batch)} out of {len(to_read)} results')
+                stats.indexed += len(batch)
+                batch = []
+        connection.executemany(insert, batch)
+        stats.indexed += len(batch)
+
+    # run folders are marked as indexed only after all their results are written, the ones with unread results
+    # are forgotten, so they are listed again next time and the unread results are not missed
+    connection.executemany('INSERT OR REPLACE INTO run_dirs (tool, name, mtime) VALUES (?, ?, ?)',
+                           [(*key, mtime) for key, mtime in run_dir_mtimes.items() if key not in deferred_run_dirs])
+    connection.executemany('DELETE FROM run_dirs WHERE tool = ? AND name = ?', deferred_run_dirs)
+    connection.commit()
+    return stats
+
+
+def main():
+    logging.basicConfig(
+        format='[%(asctime)s][%(levelname)s] %(message)s',
+        level=logging.INFO
+    )
+
+    parser = argparse.ArgumentParser(description="Indexes the results of the experiments into an SQLite database")
+    parser.add_argument("results", type=str, help="Path to folder with output of the experiments")
+    parser.add_argument("--database", type=str,
+                        help=f"Path to the database, {DATABASE_NAME} in the results folder by default")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of threads reading the results")
+    parser.add_argument("--full", action='store_true', help="Read all the results again")
+    args = parser.parse_args()
+
+    results_path = os.path.abspath(args.results)
+    database = args.database if args.database is not None else os.path.join(results_path, DATABASE_NAME)
+    connection = open_database(database)
+    try:
+        stats = index_results(results_path, connection, args.jobs, args.full)
+    finally:
+        connection.close()
+    logging.info(f'Indexed {results_path} into {database}: {stats}')
+
+
+if __name__ == '__main__':
+    main()
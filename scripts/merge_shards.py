@@ -0,0 +1,81 @@
+#!/bin/python3
+import argparse
+import logging
+import os
+import re
+import shutil
+import sys
+
+from generate_compose import Tool
+from planning import is_complete
+
+SHARD_DIR_PATTERN = re.compile(r'shard-\d+-of-\d+')
+
+
+def find_shard_dirs(results_path: str) -> list[str]:
+    return sorted(
+        entry.path for entry in os.scandir(results_path)
+        if entry.is_dir() and SHARD_DIR_PATTERN.fullmatch(entry.name)
+    )
+
+
+def merge_shard(shard_dir: str, results_path: str) -> tuple[int, int]:
+    """
+    Moves all the complete results of the shard into the same place of the common results tree.
+    Results that are incomplete or already present in the common tree are left in the shard.
+
+    :return: Number of merged results and number of conflicting results.
+    """
+    merged = 0
+    conflicts = 0
+    for tool in Tool:
+        tool_dir = os.path.join(shard_dir, tool.value)
+        if not os.path.isdir(tool_dir):
+            continue
+        for run_dir in sorted(os.scandir(tool_dir), key=lambda entry: entry.name):
+            if not run_dir.is_dir():
+                continue
+            for result_dir in sorted(os.scandir(run_dir.path), key=lambda entry: entry.name):
+                if not is_complete(result_dir.path):
+                    logging.warning(f'Result {result_dir.path} is incomplete, skipping it')
+                    continue
+                target = os.path.join(results_path, tool.value, run_dir.name, result_dir.name)
+                if os.path.exists(target):
+                    logging.error(f'Result {result_dir.path} is already present in {target}, skipping it')
+                    conflicts += 1
+                    continue
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                shutil.move(result_dir.path, target)
+                merged += 1
+    return merged, conflicts
+
+
+def main():
+    logging.basicConfig(
+        format='[%(asctime)s][%(levelname)s] %(message)s',
+        level=logging.INFO
+    )
+
+    parser = argparse.ArgumentParser(description="Merges the results of the shards into a single results tree")
+    parser.add_argument("output", type=str,
+                        help="Path to folder with output, containing the shard-i-of-N subfolders of all the shards")
+    args = parser.parse_args()
+
+    shard_dirs = find_shard_dirs(args.output)
+    if not shard_dirs:
+        logging.error(f'No shards found in {args.output}')
+        sys.exit(1)
+
+    total_conflicts = 0
+    for shard_dir in shard_dirs:
+        merged, conflicts = merge_shard(shard_dir, args.output)
+        total_conflicts += conflicts
+        logging.info(f'Merged {merged} results from {shard_dir}')
+
+    if total_conflicts:
+        logging.error(f'{total_conflicts} results were present in several shards, they are left in the shard folders')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,497 @@
+#!/bin/python3
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+from typing import Callable
+from typing import Optional
+
+from generate_compose import Tool
+from planning import CLAIMED_DIR
+from planning import DONE_DIR
+from planning import Job
+from planning import PENDING_DIR
+from planning import get_plan_dir
+from planning import get_queue_dir
+from planning import split_runs
+
+DEFAULT_INTERVAL = 10
+# recent throughput is measured over this window and compared with the throughput of the preceding windows
+DEFAULT_WINDOW = 15 * 60
+BASELINE_WINDOWS = 4
+# recent throughput below this fraction of the baseline is reported as a drop
+DROP_RATIO = 0.5
+# a worker is stalled if it has shown no activity for the generation timeout plus this grace period
+STALL_GRACE = 5 * 60
+
+
+class ResultsScanner:
+    """
+    Incrementally scans the results of an experiment. Listing of a run folder is re-read only when
+    its modification time changes, and only the unfinished results are checked on every scan.
+    """
+
+    def __init__(self, output: str, tool_name: str, run_name: str):
+        self.tool_dir = os.path.join(output, tool_name)
+        self.prefix = f'{run_name}-'
+        self.run_dirs = {}
+        # completion time of the finished jobs, i.e. modification time of their testSuite.json
+        self.completed = {}
+        # last modification time of the result folders without testSuite.json
+        self.unfinished = {}
+
+    def _result_dir(self, job: Job) -> str:
+        return os.path.join(self.tool_dir, f'{self.prefix}{job.run}', job.build_id)
+
+    def scan(self) -> None:
+        if not os.path.isdir(self.tool_dir):
+            return
+
+        for run_dir in os.scandir(self.tool_dir):
+            run = run_dir.name[len(self.prefix):]
+            if not run_dir.name.startswith(self.prefix) or not run.isdigit() or not run_dir.is_dir():
+                continue
+            # modification time is read before the listing, so the entries added meanwhile are seen on the next scan
+            mtime = run_dir.stat().st_mtime
+            if self.run_dirs.get(run_dir.path) == mtime:
+                continue
+            self.run_dirs[run_dir.path] = mtime
+            for result_dir in os.scandir(run_dir.path):
+                job = Job(int(run), result_dir.name)
+                if result_dir.is_dir() and job not in self.completed and job not in self.unfinished:
+                    self.unfinished[job] = result_dir.stat().st_mtime
+
+        for job in list(self.unfinished):
+            result_dir = self._result_dir(job)
+            try:
+                self.completed[job] = os.path.getmtime(os.path.join(result_dir, 'testSuite.json'))
+                del self.unfinished[job]
+            except FileNotFoundError:
+                if os.path.isdir(result_dir):
+                    self.unfinished[job] = os.path.getmtime(result_dir)
+                else:
+                    # moved away by `move_incomplete` before a resume
+                    del self.unfinished[job]
+
+
+def read_job_file(path: str) -> Optional[Job]:
+    try:
+        with open(path) as file:
+            parts = file.read().split()
+    except FileNotFoundError:
+        return None
+    if len(parts) != 2 or not parts[0].isdigit():
+        return None
+    return Job(int(parts[0]), parts[1])
+
+
+class QueueScanner:
+    """
+    Incrementally scans the job queue of an experiment, see `QueueJobProvider` in tga-runner.
+    Claimed jobs are the ones in progress, one per running worker.
+    """
+
+    def __init__(self, queue_dir: str):
+        self.queue_dir = queue_dir
+        self.pending = 0
+        # claim time of the jobs in progress, a claimed job file is only renamed, so its ctime is the claim time
+        self.claimed = {}
+        self.done = set()
+        self.done_names = set()
+
+    def scan(self) -> None:
+        pending_dir = os.path.join(self.queue_dir, PENDING_DIR)
+        self.pending = len(os.listdir(pending_dir)) if os.path.isdir(pending_dir) else 0
+
+        claimed = {}
+        claimed_dir = os.path.join(self.queue_dir, CLAIMED_DIR)
+        if os.path.isdir(claimed_dir):
+            for entry in os.scandir(claimed_dir):
+                job = read_job_file(entry.path)
+                if job is not None:
+                    claimed[job] = entry.stat().st_ctime
+        self.claimed = claimed
+
+        done_dir = os.path.join(self.queue_dir, DONE_DIR)
+        if os.path.isdir(done_dir):
+            for name in os.listdir(done_dir):
+                if name in self.done_names:
+                    continue
+                job = read_job_file(os.path.join(done_dir, name))
+                if job is not None:
+                    self.done_names.add(name)
+                    self.done.add(job)
+
+    def jobs(self) -> int:
+        return self.pending + len(self.claimed) + len(self.done)
+
+
+class Assignment:
+    """
+    Which worker executes each job of the latest launch, so the results can be attributed to the workers.
+    `worker_of` returns None for the jobs that are not assigned, e.g. the ones finished by the earlier launches,
+    `totals` is the number of jobs assigned to each worker, None if unknown.
+    """
+
+    def __init__(self, workers: int, worker_of: Callable[[Job], Optional[int]], totals: list[Optional[int]]):
+        self.workers = workers
+        self.worker_of = worker_of
+        self.totals = totals
+
+
+def _worker_index(path: str) -> int:
+    return int(os.path.basename(path).split('.')[0][len('worker-'):])
+
+
+def read_plan_assignment(plan_dir: str, runs: int) -> Optional[Assignment]:
+    """
+    Reads the assignment written by `execute_benchmark.py`: either resume plans or benchmark subsets,
+    whichever are newer.
+    """
+    plans = glob.glob(os.path.join(plan_dir, 'worker-*.plan'))
+    subsets = glob.glob(os.path.join(plan_dir, 'worker-*.json'))
+    if not plans and not subsets:
+        return None
+
+    if plans and (not subsets or max(map(os.path.getmtime, plans)) >= max(map(os.path.getmtime, subsets))):
+        job_workers = {}
+        totals = [0] * len(plans)
+        for path in plans:
+            with open(path) as file:
+                for line in file:
+                    run, build_id = line.split()
+                    job_workers[Job(int(run), build_id)] = _worker_index(path)
+                    totals[_worker_index(path)] += 1
+        return Assignment(len(plans), job_workers.get, totals)
+
+    benchmark_workers = {}
+    totals = [0] * len(subsets)
+    for path in subsets:
+        with open(path) as file:
+            for benchmark in json.load(file):
+                benchmark_workers[benchmark['build_id']] = _worker_index(path)
+                # each benchmark of a subset is executed in every run
+                totals[_worker_index(path)] += runs
+    return Assignment(len(subsets), lambda job: benchmark_workers.get(job.build_id), totals)
+
+
+def get_assignment(
+        output: str,
+        run_name: str,
+        runs: int,
+        workers: Optional[int],
+        benchmarks: Optional[int]
+) -> Optional[Assignment]:
+    """
+    :return: Assignment of the jobs to the workers, or None if the workers share a job queue
+     or the assignment is not known.
+    """
+    if os.path.isdir(get_queue_dir(output, run_name)):
+        return None
+    assignment = read_plan_assignment(get_plan_dir(output, run_name), runs)
+    if assignment is not None or workers is None:
+        return assignment
+
+    run_ranges = split_runs(runs, workers)
+    run_workers = {run: worker for worker, run_range in enumerate(run_ranges) for run in run_range}
+    totals = [len(run_range) * benchmarks if benchmarks is not None else None for run_range in run_ranges]
+    return Assignment(workers, lambda job: run_workers.get(job.run), totals)
+
+
+class WorkerStatus:
+    def __init__(self, name: str):
+        self.name = name
+        self.completed = None
+        self.failed = None
+        self.rate = None
+        self.current = None
+        # time of the last completion or of the last change of the current result folder
+        self.activity = None
+        self.status = 'waiting'
+
+
+class Progress:
+    def __init__(self):
+        self.total = None
+        self.completed = 0
+        self.failed = None
+        self.in_progress = 0
+        self.recent_rate = 0.0
+        self.baseline_rate = 0.0
+        self.worker_rate = None
+        self.eta = None
+        self.throughput_drop = False
+        self.workers = []
+
+    def stalled(self) -> list[WorkerStatus]:
+        return [worker for worker in self.workers if worker.status == 'stalled']
+
+
+def get_rate(times: list[float], start: float, end: float) -> float:
+    """
+    Number of the jobs completed in (start, end] per hour.
+    """
+    return sum(1 for t in times if start < t <= end) * 3600 / (end - start)
+
+
+def get_progress(
+        results: ResultsScanner,
+        queue: Optional[QueueScanner],
+        assignment: Optional[Assignment],
+        benchmarks: Optional[int],
+        runs: int,
+        now: float,
+        window: int,
+        stall_timeout: int
+) -> Progress:
+    progress = Progress()
+    times = list(results.completed.values())
+    progress.completed = len(times)
+    progress.recent_rate = get_rate(times, now - window, now)
+    progress.baseline_rate = get_rate(times, now - (BASELINE_WINDOWS + 1) * window, now - window)
+    progress.throughput_drop = progress.recent_rate < DROP_RATIO * progress.baseline_rate
+
+    if queue is not None:
+        progress.in_progress = len(queue.claimed)
+        progress.failed = len(queue.done - results.completed.keys())
+        for index, (job, claim_time) in enumerate(sorted(queue.claimed.items(), key=lambda item: item[1])):
+            # workers pulling from the queue are anonymous, each of the claimed jobs is executed by one of them
+            worker = WorkerStatus(f'queue-{index}')
+            worker.current = job
+            worker.activity = max(claim_time, results.unfinished.get(job, claim_time))
+            worker.status = 'stalled' if now - worker.activity > stall_timeout else 'running'
+            progress.workers.append(worker)
+        if progress.workers:
+            progress.worker_rate = progress.recent_rate / len(progress.workers)
+        progress.total = queue.pending + len(queue.claimed.keys() | queue.done | results.completed.keys())
+    elif assignment is not None:
+        progress.failed = 0
+        completed = [[] for _ in range(assignment.workers)]
+        unfinished = [[] for _ in range(assignment.workers)]
+        unassigned = 0
+        for job, completion_time in results.completed.items():
+            index = assignment.worker_of(job)
+            if index is None:
+                unassigned += 1
+            else:
+                completed[index].append(completion_time)
+        for job, mtime in results.unfinished.items():
+            index = assignment.worker_of(job)
+            if index is not None:
+                unfinished[index].append((mtime, job))
+
+        for index in range(assignment.workers):
+            worker = WorkerStatus(f'worker-{index}')
+            worker.completed = len(completed[index])
+            worker.rate = get_rate(completed[index], now - window, now)
+            worker.activity = max(completed[index] + [mtime for mtime, _ in unfinished[index]], default=None)
+            # a worker executes one job at a time, so only its latest unfinished job can be in progress
+            current = max(unfinished[index], default=None)
+            if current is not None and current[0] >= worker.activity:
+                worker.current = current[1]
+            worker.failed = len(unfinished[index]) - (1 if worker.current is not None else 0)
+
+            total = assignment.totals[index]
+            if total is not None and worker.completed + worker.failed >= total:
+                worker.status = 'done'
+            elif worker.activity is None:
+                worker.status = 'waiting'
+            elif now - worker.activity > stall_timeout:
+                worker.status = 'stalled'
+            else:
+                worker.status = 'running'
+
+            progress.failed += worker.failed
+            progress.in_progress += 1 if worker.current is not None else 0
+            progress.workers.append(worker)
+
+        running = [worker for worker in progress.workers if worker.status == 'running']
+        if running:
+            progress.worker_rate = sum(worker.rate for worker in running) / len(running)
+        if None not in assignment.totals:
+            progress.total = sum(assignment.totals) + unassigned
+    else:
+        progress.in_progress = len(results.unfinished)
+
+    # the queue and the plans know the exact number of jobs, e.g. of a shard or of a resumed run
+    if progress.total is None and benchmarks is not None:
+        progress.total = runs * benchmarks
+    if progress.total is not None and progress.recent_rate > 0:
+        remaining = max(progress.total - progress.completed - (progress.failed or 0), 0)
+        progress.eta = remaining / progress.recent_rate * 3600
+    return progress
+
+
+def format_duration(seconds: float) -> str:
+    seconds = int(seconds)
+    if seconds >= 3600:
+        return f'{seconds // 3600}h {seconds % 3600 // 60:02d}m'
+    return f'{seconds // 60}m {seconds % 60:02d}s'
+
+
+def format_optional(value, pattern: str = '{}') -> str:
+    return '-' if value is None else pattern.format(value)
+
+
+def format_progress(progress: Progress, tool_name: str, run_name: str, now: float) -> str:
+    total = format_optional(progress.total)
+    percent = f' ({progress.completed / progress.total:.1%})' if progress.total else ''
+    finished = progress.completed + (progress.failed or 0)
+    failure_ratio = f' ({progress.failed / finished:.1%})' if progress.failed is not None and finished else ''
+    lines = [
+        f'{tool_name}/{run_name} at {time.strftime("%H:%M:%S", time.localtime(now))}',
+        f'completed {progress.completed}/{total}{percent}, failed {format_optional(progress.failed)}{failure_ratio}, '
+        f'in progress {progress.in_progress}',
+        f'throughput {progress.recent_rate:.1f} jobs/h (before: {progress.baseline_rate:.1f} jobs/h), '
+        f'per worker {format_optional(progress.worker_rate, "{:.1f}")} jobs/h, '
+        f'ETA {format_optional(None if progress.eta is None else format_duration(progress.eta))}',
+    ]
+    if progress.throughput_drop:
+        lines.append(f'WARNING: throughput has dropped below {DROP_RATIO:.0%} of the earlier throughput')
+    if progress.stalled():
+        lines.append(f'WARNING: {len(progress.stalled())} stalled workers: '
+                     f'{", ".join(worker.name for worker in progress.stalled())}')
+
+    if progress.workers:
+        rows = [['worker', 'completed', 'failed', 'jobs/h', 'current job', 'idle', 'status']]
+        for worker in progress.workers:
+            rows.append([
+                worker.name,
+                format_optional(worker.completed),
+                format_optional(worker.failed),
+                format_optional(worker.rate, '{:.1f}'),
+                format_optional(worker.current and f'{worker.current.run} {worker.current.build_id}'),
+                format_optional(None if worker.activity is None else format_duration(max(now - worker.activity, 0))),
+                worker.status.upper() if worker.status == 'stalled' else worker.status,
+            ])
+        widths = [max(len(row[column]) for row in rows) for column in range(len(rows[0]))]
+        lines.append('')
+        lines += ['  '.join(cell.ljust(width) for cell, width in zip(row, widths)).rstrip() for row in rows]
+    return '\n'.join(lines)
+
+
+def format_metrics(progress: Progress, tool_name: str, run_name: str, now: float) -> str:
+    """
+    Metrics in Prometheus text format, for the textfile collector of the node exporter.
+    """
+    labels = f'tool="{tool_name}",run_name="{run_name}"'
+    metrics = [
+        ('tga_jobs_total', 'Number of (run, benchmark) jobs of the experiment', progress.total),
+        ('tga_jobs_completed', 'Number of jobs with complete results', progress.completed),
+        ('tga_jobs_failed', 'Number of jobs finished without a test suite', progress.failed),
+        ('tga_jobs_in_progress', 'Number of jobs being executed', progress.in_progress),
+        ('tga_throughput_jobs_per_hour', 'Completed jobs per hour over the recent window', progress.recent_rate),
+        ('tga_baseline_throughput_jobs_per_hour', 'Completed jobs per hour before the recent window',
+         progress.baseline_rate),
+        ('tga_throughput_drop', 'Whether the recent throughput has dropped', int(progress.throughput_drop)),
+        ('tga_eta_seconds', 'Estimated time until all the jobs are finished', progress.eta),
+        ('tga_workers_stalled', 'Number of workers without activity', len(progress.stalled())),
+        ('tga_monitor_last_scan_timestamp_seconds', 'Time of the last scan of the results', now),
+    ]
+    lines = []
+    for name, description, value in metrics:
+        if value is None:
+            continue
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge', f'{name}{{{labels}}} {value:.15g}']
+
+    worker_metrics = [
+        ('tga_worker_jobs_completed', 'Number of jobs completed by the worker', lambda worker: worker.completed),
+        ('tga_worker_jobs_failed', 'Number of jobs failed by the worker', lambda worker: worker.failed),
+        ('tga_worker_throughput_jobs_per_hour', 'Completed jobs per hour of the worker over the recent window',
+         lambda worker: worker.rate),
+        ('tga_worker_last_activity_timestamp_seconds', 'Time of the last activity of the worker',
+         lambda worker: worker.activity),
+        ('tga_worker_stalled', 'Whether the worker has shown no activity for too long',
+         lambda worker: int(worker.status == 'stalled')),
+    ]
+    for name, description, get_value in worker_metrics:
+        values = [(worker.name, get_value(worker)) for worker in progress.workers if get_value(worker) is not None]
+        if not values:
+            continue
+        lines += [f'# HELP {name} {description}', f'# TYPE {name} gauge']
+        lines += [f'{name}{{{labels},worker="{worker}"}} {value:.15g}' for worker, value in values]
+    return '\n'.join(lines) + '\n'
+
+
+def write_metrics(path: str, text: str) -> None:
+    # the collector may read the file at any moment, so it is replaced atomically
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as file:
+        file.write(text)
+    os.replace(tmp_path, path)
+
+
+def count_benchmarks(path: Optional[str]) -> Optional[int]:
+    if path is None or not os.path.isfile(path):
+        return None
+    with open(path) as file:
+        return len(json.load(file))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shows the progress of a running experiment")
+    parser.add_argument("output", type=str, help="Path to folder with output of the experiment")
+    parser.add_argument("--tool", type=Tool, choices=list(Tool), help="Name of tool", required=True)
+    parser.add_argument("--runName", type=str, help="Name of the experiment", required=True)
+    parser.add_argument("--runs", type=int, help="Number of total runs", required=True)
+    parser.add_argument("--timeout", type=int, help="Timeout in seconds", required=True)
+    parser.add_argument("--workers", type=int,
+                        help="Number of parallel workers, needed to attribute the results to the workers "
+                             "when the runs are split between them statically",
+                        required=False)
+    parser.add_argument("--benchmarks", type=str,
+                        help="Path to benchmarks.json on the host, needed to show the total number of jobs, "
+                             "benchmarks-<runName>.json in the output folder is used by default",
+                        required=False)
+    parser.add_argument("--interval", type=int, default=DEFAULT_INTERVAL, help="Seconds between the scans",
+                        required=False)
+    parser.add_argument("--window", type=int, default=DEFAULT_WINDOW,
+                        help="Seconds over which the recent throughput is measured", required=False)
+    parser.add_argument("--stallTimeout", type=int,
+                        help="Seconds without activity after which a worker is reported as stalled, "
+                             f"timeout + {STALL_GRACE} by default",
+                        required=False)
+    parser.add_argument("--metrics", type=str, help="Path to write the Prometheus metrics to", required=False)
+    parser.add_argument("--once", action='store_true', help="Print the progress once and exit", required=False)
+    args = parser.parse_args()
+
+    output = os.path.abspath(args.output)
+    benchmarks_file = args.benchmarks or os.path.join(output, f'benchmarks-{args.runName}.json')
+    benchmarks = count_benchmarks(benchmarks_file)
+    stall_timeout = args.stallTimeout if args.stallTimeout is not None else args.timeout + STALL_GRACE
+
+    results = ResultsScanner(output, args.tool.value, args.runName)
+    queue_dir = get_queue_dir(output, args.runName)
+    queue = QueueScanner(queue_dir) if os.path.isdir(queue_dir) else None
+    assignment = get_assignment(output, args.runName, args.runs, args.workers, benchmarks)
+
+    try:
+        while True:
+            now = time.time()
+            results.scan()
+            if queue is not None:
+                queue.scan()
+            progress = get_progress(results, queue, assignment, benchmarks, args.runs, now, args.window,
+                                    stall_timeout)
+
+            report = format_progress(progress, args.tool.value, args.runName, now)
+            if sys.stdout.isatty() and not args.once:
+                # redraw the table in place
+                report = '\033[H\033[J' + report
+            print(report, flush=True)
+            if args.metrics is not None:
+                write_metrics(args.metrics, format_metrics(progress, args.tool.value, args.runName, now))
+
+            finished = progress.total is not None and \
+                progress.completed + (progress.failed or 0) >= progress.total and progress.in_progress == 0
+            if args.once or finished:
+                break
+            time.sleep(args.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
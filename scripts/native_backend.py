@@ -0,0 +1,223 @@
+import os
+import signal
+import subprocess
+import sys
+import time
+
+from generate_compose import Tool
+from generate_compose import ToolArgs
+from worker_watchdog import Watchdog
+
+RUNNER_JAR = os.path.join('tga-runner', 'build', 'libs', 'tga-runner.jar')
+TOOL_JAR = os.path.join('tga-tool', 'build', 'libs', 'tga-tool.jar')
+# paths inside the results volume of the containers, as they are returned by the planning steps
+RESULTS_MOUNT = '/var/results'
+POLL_INTERVAL = 1
+# time given to the tool to shut down after its runner has finished, and to the processes after SIGTERM
+SHUTDOWN_TIMEOUT = 30
+
+
+def to_host_path(path: str, output: str) -> str:
+    if path == RESULTS_MOUNT or path.startswith(RESULTS_MOUNT + '/'):
+        return os.path.join(output, os.path.relpath(path, RESULTS_MOUNT))
+    return path
+
+
+def _signal_group(process: subprocess.Popen, sig: int) -> None:
+    try:
+        if sys.platform.startswith('win'):
+            process.kill()
+        else:
+            os.killpg(process.pid, sig)
+    except ProcessLookupError:
+        pass
+
+
+class NativeWorker:
+    """
+    Runner and tool JVMs of a single worker, started as local processes.
+    Each of them runs in its own session, so all the processes started by the tool are stopped together with it.
+    The runner listens on any free port and writes it into `port_file`, the tool is started once the port is known,
+    so the workers never race with each other or with other processes for the ports.
+    Both processes run in `work_dir`, so the files the tools create in their working directory
+    (e.g. Jazzer crash files) are not shared between the workers.
+    """
+
+    def __init__(
+            self,
+            name: str,
+            runner_command: list[str],
+            tool_command: list[str],
+            port_file: str,
+            log_dir: str,
+            work_dir: str
+    ):
+        self.name = name
+        self.runner_command = runner_command
+        self.tool_command = tool_command
+        self.port_file = port_file
+        self.work_dir = work_dir
+        self.runner_log_path = os.path.join(log_dir, f'{name}-runner.log')
+        self.tool_log_path = os.path.join(log_dir, f'{name}-tool.log')
+        self.env = None
+        self.runner = None
+        self.tool = None
+        self.runner_finished_at = None
+
+    def _start(self, command: list[str], log_path: str, env: dict) -> subprocess.Popen:
+        with open(log_path, 'ab') as log_file:
+            return subprocess.Popen(
+                command,
+                cwd=self.work_dir,
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=log_file,
+                stderr=subprocess.STDOUT,
+                start_new_session=not sys.platform.startswith('win'),
+            )
+
+    def start(self, env: dict) -> None:
+        self.env = env
+        self.tool = None
+        self.runner_finished_at = None
+        os.makedirs(self.work_dir, exist_ok=True)
+        if os.path.exists(self.port_file):
+            os.remove(self.port_file)
+        self.runner = self._start(self.runner_command, self.runner_log_path, env)
+        self._start_tool()
+
+    def _start_tool(self) -> None:
+        try:
+            with open(self.port_file) as file:
+                port = file.read().strip()
+        except FileNotFoundError:
+            return
+        # the tool retries the connection until the runner accepts it
+        self.tool = self._start(self.tool_command + ['--port', port], self.tool_log_path, self.env)
+
+    def poll(self) -> bool:
+        """
+        Starts the tool once the runner is listening.
+
+        :return: True if the worker has finished.
+        """
+        if self.tool is None:
+            self._start_tool()
+        if self.runner.poll() is None:
+            return False
+        if self.runner_finished_at is None:
+            self.runner_finished_at = time.monotonic()
+        if self.tool is None:
+            return True
+        if self.tool.poll() is None and time.monotonic() - self.runner_finished_at > SHUTDOWN_TIMEOUT:
+            _signal_group(self.tool, signal.SIGKILL)
+            self.tool.wait()
+        return self.tool.poll() is not None
+
+    def stop(self) -> None:
+        for process in (self.runner, self.tool):
+            if process is not None and process.poll() is None:
+                _signal_group(process, signal.SIGTERM)
+        deadline = time.monotonic() + SHUTDOWN_TIMEOUT
+        for process in (self.runner, self.tool):
+            if process is None:
+                continue
+            try:
+                process.wait(max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                _signal_group(process, signal.SIGKILL)
+                process.wait()
+
+
+def create_workers(
+        pipeline_home: str,
+        tool: Tool,
+        tool_args: ToolArgs,
+        run_name: str,
+        timeout: int,
+        output: str,
+        worker_jobs: list[tuple[str, list[str]]],
+        log_dir: str,
+        watchdog: Watchdog = None
+) -> list[NativeWorker]:
+    """
+    Creates a worker for each of the `worker_jobs` (see `generate_compose.get_worker_jobs`),
+    paths inside the results volume are mapped to `output`. If `watchdog` is set, the runners write its heartbeats.
+    Each worker runs in its own working directory `log_dir/<worker>`, so all the paths passed to it are absolute.
+    """
+    pipeline_home = os.path.abspath(pipeline_home)
+    output = os.path.abspath(output)
+    log_dir = os.path.abspath(log_dir)
+    runner_jar = os.path.join(pipeline_home, RUNNER_JAR)
+    tool_jar = os.path.join(pipeline_home, TOOL_JAR)
+    workers = []
+    for index, (benchmarks_path, jobs_options) in enumerate(worker_jobs):
+        name = f'worker-{tool.name}-{index}'
+        if watchdog is not None:
+            jobs_options = jobs_options + ['--heartbeat', watchdog.get_heartbeat_file(name)]
+            watchdog.add_worker(name, tool.value, run_name)
+        port_file = os.path.join(log_dir, f'{name}-runner.port')
+        runner_command = [
+            'java', '-jar', runner_jar,
+            '-p', '0',
+            '--portFile', port_file,
+            '-c', os.path.abspath(to_host_path(benchmarks_path, output)),
+            '-t', str(timeout),
+            '-o', output,
+            '--runName', run_name,
+            *[to_host_path(option, output) for option in jobs_options],
+        ]
+        tool_command = [
+            'java', '-jar', tool_jar,
+            '--ip', 'localhost',
+            '--tool', tool.name,
+            f'--toolArgs={tool_args}',
+        ]
+        work_dir = os.path.join(log_dir, name)
+        workers.append(NativeWorker(name, runner_command, tool_command, port_file, log_dir, work_dir))
+    return workers
+
+
+def run_workers(workers: list[NativeWorker], pipeline_home: str, watchdog: Watchdog = None) -> bool:
+    """
+    Runs all the workers until they finish. On interruption all the workers are stopped.
+    If `watchdog` is set, hung workers are restarted after the job they are hung on is skipped, and the restarted
+    runner skips the jobs that already have a result folder, so it continues with the next unfinished job.
+    Workers that hang too often are stopped.
+
+    :return: True if all the runners have finished successfully.
+    """
+    env = dict(os.environ)
+    env.setdefault('TGA_PIPELINE_HOME', os.path.abspath(pipeline_home))
+
+    running = list(workers)
+    # SIGTERM is handled the same way as Ctrl+C, so the workers are not left behind
+    previous_handler = signal.signal(signal.SIGTERM, signal.default_int_handler)
+    try:
+        for worker in workers:
+            worker.start(env)
+            print(f'Started {worker.name}, logs are written to {worker.runner_log_path} and {worker.tool_log_path}')
+            if watchdog is not None:
+                watchdog.mark_started(worker.name)
+        while running:
+            time.sleep(POLL_INTERVAL)
+            if watchdog is not None:
+                for worker in [worker for worker in running if worker.runner.poll() is None]:
+                    if not watchdog.is_hung(worker.name):
+                        continue
+                    restart = watchdog.handle_hung(worker.name)
+                    worker.stop()
+                    if restart:
+                        worker.start(env)
+                    watchdog.mark_started(worker.name)
+            for worker in [worker for worker in running if worker.poll()]:
+                running.remove(worker)
+                print(f'{worker.name} has finished with exit code {worker.runner.returncode}')
+    except KeyboardInterrupt:
+        print('Interrupted, stopping all the workers', file=sys.stderr)
+    finally:
+        for worker in running:
+            worker.stop()
+        signal.signal(signal.SIGTERM, previous_handler)
+
+    return not running and all(worker.runner.returncode == 0 for worker in workers)
@@ -0,0 +1,318 @@
+import heapq
+import json
+import os
+import shutil
+import statistics
+from collections import namedtuple
+
+# layout of the job queue shared by the runners, see `QueueJobProvider` in tga-runner
+PENDING_DIR = 'pending'
+CLAIMED_DIR = 'claimed'
+DONE_DIR = 'done'
+
+# files written by `TgaRunner` once the result is complete
+RESULT_FILES = ['benchmark.json', 'testSuite.json']
+
+# benchmark metadata shipped with the repository, used for cost estimation
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMPLEXITY_FILE = os.path.join(REPO_ROOT, 'cyclomatic-complexity.txt')
+PROPERTIES_FILE = os.path.join(REPO_ROOT, 'properties.json')
+COST_SOURCES = ['history', 'complexity', 'sloc', 'uniform']
+
+Job = namedtuple('Job', ['run', 'build_id'])
+
+
+def get_queue_dir(results_path: str, run_name: str) -> str:
+    return os.path.join(results_path, f'queue-{run_name}')
+
+
+def get_result_dir(results_path: str, tool_name: str, run_name: str, job: Job) -> str:
+    # same layout as the one used by `TgaRunner`
+    return os.path.join(results_path, tool_name, f'{run_name}-{job.run}', job.build_id)
+
+
+def plan_jobs(run_ids: range, build_ids: list[str]) -> list[Job]:
+    """
+    All the (run, benchmark) pairs in the same order as they are executed by a runner with a static run range.
+    """
+    return [Job(run, build_id) for run in run_ids for build_id in build_ids]
+
+
+def select_shard(jobs: list[Job], shard: int, shards: int) -> list[Job]:
+    """
+    Deterministic slice of the jobs for shard `shard` out of `shards`: the jobs are ordered by run and build id and
+    dealt out round-robin, so every shard gets the same number of jobs (up to one) and a mix of all the benchmarks.
+    """
+    return sorted(jobs)[shard::shards]
+
+
+def get_shard_dir(results_path: str, shard: int, shards: int) -> str:
+    return os.path.join(results_path, f'shard-{shard}-of-{shards}')
+
+
+def get_incomplete_dir(results_path: str, tool_name: str, run_name: str, job: Job) -> str:
+    return os.path.join(results_path, f'incomplete-{run_name}', tool_name, f'{run_name}-{job.run}', job.build_id)
+
+
+def is_complete(result_dir: str) -> bool:
+    return all(os.path.isfile(os.path.join(result_dir, name)) for name in RESULT_FILES)
+
+
+def exclude_finished(jobs: list[Job], results_path: str, tool_name: str, run_name: str) -> list[Job]:
+    return [job for job in jobs if not is_complete(get_result_dir(results_path, tool_name, run_name, job))]
+
+
+def move_incomplete(jobs: list[Job], results_path: str, tool_name: str, run_name: str) -> int:
+    """
+    Moves the results of `jobs` that were started, but not finished, out of the results tree
+    into `incomplete-<run name>` folder, otherwise the runners would skip these jobs.
+
+    :return: Number of moved results.
+    """
+    moved = 0
+    for job in jobs:
+        result_dir = get_result_dir(results_path, tool_name, run_name, job)
+        if not os.path.exists(result_dir) or is_complete(result_dir):
+            continue
+        incomplete_dir = get_incomplete_dir(results_path, tool_name, run_name, job)
+        if os.path.exists(incomplete_dir):
+            shutil.rmtree(incomplete_dir)
+        os.makedirs(os.path.dirname(incomplete_dir), exist_ok=True)
+        shutil.move(result_dir, incomplete_dir)
+        moved += 1
+    return moved
+
+
+def write_queue(queue_dir: str, jobs: list[Job]) -> None:
+    """
+    Creates a job queue, runners claim the jobs in the order of `jobs`.
+    An existing queue is replaced, so the jobs left unfinished by the previous launch should be a part of `jobs`.
+    """
+    if os.path.exists(queue_dir):
+        shutil.rmtree(queue_dir)
+    for name in (PENDING_DIR, CLAIMED_DIR, DONE_DIR):
+        path = os.path.join(queue_dir, name)
+        os.makedirs(path)
+        # runners are started under a different user and have to move the job files around
+        os.chmod(path, 0o777)
+    os.chmod(queue_dir, 0o777)
+
+    width = len(str(len(jobs)))
+    for index, job in enumerate(jobs):
+        job_file = os.path.join(queue_dir, PENDING_DIR, f'{index:0{width}d}-{job.run}-{job.build_id}')
+        with open(job_file, 'w') as file:
+            file.write(f'{job.run} {job.build_id}\n')
+        os.chmod(job_file, 0o666)
+
+
+def read_complexity_costs(path: str = COMPLEXITY_FILE) -> dict[str, float]:
+    costs = {}
+    with open(path) as file:
+        for line in file:
+            if line.strip():
+                build_id, complexity = line.split()
+                costs[build_id] = float(complexity)
+    return costs
+
+
+def read_sloc_costs(path: str = PROPERTIES_FILE) -> dict[str, float]:
+    with open(path) as file:
+        properties = json.load(file)
+    return {entry['benchmark']: float(entry['properties']['SLoC']) for entry in properties}
+
+
+def measured_generation_time(result_dir: str) -> float:
+    """
+    Approximate generation time of a finished result: `testSuite.json` is written by the runner right after
+    the generation, while the tools start writing into the result directory as soon as they are started.
+    """
+    end = os.path.getmtime(os.path.join(result_dir, 'testSuite.json'))
+    start = end
+    for dir_path, dir_names, file_names in os.walk(result_dir):
+        for name in dir_names + file_names:
+            start = min(start, os.path.getmtime(os.path.join(dir_path, name)))
+    return end - start
+
+
+def read_history_costs(results_path: str, tool_name: str) -> dict[str, float]:
+    """
+    Mean measured generation time of each benchmark over all the earlier runs of the tool in `results_path`.
+    """
+    times = {}
+    tool_dir = os.path.join(results_path, tool_name)
+    if not os.path.isdir(tool_dir):
+        return {}
+    for run_dir in os.scandir(tool_dir):
+        if not run_dir.is_dir():
+            continue
+        for result_dir in os.scandir(run_dir.path):
+            if os.path.isfile(os.path.join(result_dir.path, 'testSuite.json')):
+                times.setdefault(result_dir.name, []).append(measured_generation_time(result_dir.path))
+    return {build_id: statistics.mean(values) for build_id, values in times.items()}
+
+
+def read_history_sizes(results_path: str, tool_name: str) -> dict[str, float]:
+    """
+    Mean disk usage of the results of each benchmark over all the earlier runs of the tool in `results_path`, in bytes.
+    """
+    sizes = {}
+    tool_dir = os.path.join(results_path, tool_name)
+    if not os.path.isdir(tool_dir):
+        return {}
+    for run_dir in os.scandir(tool_dir):
+        if not run_dir.is_dir():
+            continue
+        for result_dir in os.scandir(run_dir.path):
+            if not is_complete(result_dir.path):
+                continue
+            size = 0
+            for dir_path, _, file_names in os.walk(result_dir.path):
+                size += sum(os.lstat(os.path.join(dir_path, name)).st_size for name in file_names)
+            sizes.setdefault(result_dir.name, []).append(size)
+    return {build_id: statistics.mean(values) for build_id, values in sizes.items()}
+
+
+def estimate_job_times(
+        build_ids: list[str],
+        timeout: int,
+        overhead: float,
+        results_path: str,
+        tool_name: str,
+        history: dict[str, float] = None
+) -> dict[str, float]:
+    """
+    Expected wall-clock time of a job on each of the benchmarks: the mean generation time of the earlier runs
+    of the tool (see `read_history_costs`), or the timeout if there are none, plus the `overhead` of a job.
+    The generation is stopped at the timeout, so longer historical times are capped at it.
+    """
+    if history is None:
+        history = read_history_costs(results_path, tool_name)
+    return {
+        build_id: min(history.get(build_id, timeout), timeout) + overhead for build_id in build_ids
+    }
+
+
+def estimate_costs(
+        build_ids: list[str],
+        source: str,
+        results_path: str = None,
+        tool_name: str = None
+) -> dict[str, float]:
+    """
+    Estimated cost of running a tool on each of the benchmarks. Benchmarks that are missing
+    in the cost source get the mean cost of the known ones.
+    """
+    if source == 'history':
+        known = read_history_costs(results_path, tool_name)
+    elif source == 'complexity':
+        known = read_complexity_costs()
+    elif source == 'sloc':
+        known = read_sloc_costs()
+    else:
+        known = {}
+
+    known = {build_id: cost for build_id, cost in known.items() if build_id in build_ids}
+    default = statistics.mean(known.values()) if known else 1.0
+    return {build_id: known.get(build_id, default) for build_id in build_ids}
+
+
+def partition_lpt(costs: dict, workers: int) -> list[list]:
+    """
+    Longest-processing-time-first packing: items (benchmarks or jobs) are assigned in the order of decreasing cost,
+    each to the currently least loaded worker. Workers without items are omitted.
+    """
+    loads = [(0.0, worker) for worker in range(workers)]
+    partitions = [[] for _ in range(workers)]
+    for item in sorted(costs, key=lambda key: (-costs[key], key)):
+        load, worker = heapq.heappop(loads)
+        partitions[worker].append(item)
+        heapq.heappush(loads, (load + costs[item], worker))
+    return [partition for partition in partitions if partition]
+
+
+def split_runs(runs: int, workers: int) -> list[range]:
+    """
+    Static split of the runs between the workers, the same as the one of `generate_compose`.
+    """
+    result = []
+    start = 0
+    for worker in range(workers):
+        count = runs // workers + (1 if worker < runs % workers else 0)
+        result.append(range(start, start + count))
+        start += count
+    return result
+
+
+def simulate_queue(job_costs: list[float], workers: int) -> list[float]:
+    """
+    Loads of the workers that pull the jobs from a shared queue in the given order.
+    """
+    loads = [(0.0, worker) for worker in range(workers)]
+    for cost in job_costs:
+        load, worker = heapq.heappop(loads)
+        heapq.heappush(loads, (load + cost, worker))
+    return [load for load, _ in sorted(loads, key=lambda item: item[1])]
+
+
+def get_plan_dir(results_path: str, run_name: str) -> str:
+    return os.path.join(results_path, f'plan-{run_name}')
+
+
+def write_benchmark_subsets(plan_dir: str, benchmarks: list[dict], partitions: list[list[str]]) -> list[str]:
+    """
+    Writes a benchmarks file for each of the partitions, benchmarks keep their original order.
+
+    :return: Names of the written files inside `plan_dir`.
+    """
+    os.makedirs(plan_dir, exist_ok=True)
+    names = []
+    for worker, partition in enumerate(partitions):
+        subset = set(partition)
+        name = f'worker-{worker}.json'
+        with open(os.path.join(plan_dir, name), 'w') as file:
+            file.write(json.dumps([benchmark for benchmark in benchmarks if benchmark['build_id'] in subset], indent=2))
+        names.append(name)
+    return names
+
+
+def write_job_plans(plan_dir: str, partitions: list[list[Job]]) -> list[str]:
+    """
+    Writes a plan file with "run buildId" lines for each of the partitions, jobs are ordered by run.
+
+    :return: Names of the written files inside `plan_dir`.
+    """
+    os.makedirs(plan_dir, exist_ok=True)
+    names = []
+    for worker, partition in enumerate(partitions):
+        name = f'worker-{worker}.plan'
+        with open(os.path.join(plan_dir, name), 'w') as file:
+            for job in sorted(partition):
+                file.write(f'{job.run} {job.build_id}\n')
+        names.append(name)
+    return names
+
+
+def apportion_workers(work: list[float], workers: int) -> list[int]:
+    """
+    Splits the workers between several experiments proportionally to their remaining work (largest remainder method),
+    so all the experiments finish at about the same time. Every experiment with some work left gets at least one worker.
+    """
+    active = [index for index, amount in enumerate(work) if amount > 0]
+    assert workers >= len(active), f'{workers} workers are not enough for {len(active)} experiments'
+    result = [0] * len(work)
+    if not active:
+        return result
+
+    for index in active:
+        result[index] = 1
+    spare = workers - len(active)
+    total = sum(work[index] for index in active)
+    shares = {index: work[index] / total * workers - 1 for index in active}
+    for index in active:
+        extra = min(spare, max(0, int(shares[index])))
+        result[index] += extra
+        shares[index] -= extra
+        spare -= extra
+    for index in sorted(active, key=lambda key: -shares[key])[:spare]:
+        result[index] += 1
+    return result
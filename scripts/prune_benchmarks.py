@@ -0,0 +1,151 @@
+#!/bin/python3
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+
+# files of the project root that are kept, TestSpark opens the benchmark root as an IDEA project
+KEPT_ROOT_FILES = [
+    'pom.xml',
+    'build.gradle',
+    'build.gradle.kts',
+    'settings.gradle',
+    'settings.gradle.kts',
+    'gradle.properties',
+    'gradlew',
+    'gradle',
+]
+# manual tests are read by `ManualTests` tool from the benchmark root
+KEPT_TEST_SOURCES = os.path.join('src', 'test', 'java')
+
+
+def get_kept_paths(benchmark: dict) -> set[str]:
+    root = os.path.normpath(benchmark['root'])
+    paths = [benchmark['src'], benchmark['bin']] + benchmark['classPath']
+    paths += [os.path.join(root, file) for file in KEPT_ROOT_FILES]
+    paths.append(os.path.join(root, KEPT_TEST_SOURCES))
+    return {
+        os.path.normpath(path) for path in paths
+        if path and os.path.normpath(path).startswith(root + os.sep)
+    }
+
+
+def get_used_paths(benchmark: dict) -> list[str]:
+    """
+    Paths read by the pipeline: sources and compiled class of the CUT and the class path entries.
+    """
+    klass = benchmark['klass'].split('.')
+    source = os.path.join(benchmark['src'], *klass)
+    return [benchmark['src'], benchmark['bin'], os.path.join(benchmark['bin'], *klass) + '.class',
+            source + '.java', source + '.kt'] + benchmark['classPath']
+
+
+def disk_usage(paths: list[str]) -> int:
+    """
+    Total size of all the files under `paths`, hard-linked files are counted once.
+    """
+    seen = set()
+    total = 0
+    for path in paths:
+        for dir_path, _, file_names in os.walk(path):
+            for name in file_names:
+                stat = os.lstat(os.path.join(dir_path, name))
+                if (stat.st_dev, stat.st_ino) in seen:
+                    continue
+                seen.add((stat.st_dev, stat.st_ino))
+                total += stat.st_size
+    return total
+
+
+def remove(path: str) -> None:
+    if os.path.isdir(path) and not os.path.islink(path):
+        shutil.rmtree(path)
+    else:
+        os.remove(path)
+
+
+def prune_benchmark(benchmark: dict) -> bool:
+    """
+    Removes everything from the benchmark root except the files that are read by the pipeline:
+    sources, compiled classes, class path, manual tests and build files.
+
+    :return: True if anything was removed.
+    """
+    root = os.path.normpath(benchmark['root'])
+    if root in (os.path.normpath(benchmark['src']), os.path.normpath(benchmark['bin'])):
+        logging.warning(f'Sources or classes of benchmark {benchmark["build_id"]} are in its root, skipping pruning')
+        return False
+
+    kept = get_kept_paths(benchmark)
+    ancestors = {os.path.dirname(path) for path in kept}
+    for path in list(ancestors):
+        while path.startswith(root + os.sep):
+            path = os.path.dirname(path)
+            ancestors.add(path)
+
+    removed = False
+    for dir_path, dir_names, file_names in os.walk(root):
+        for name in list(dir_names):
+            path = os.path.join(dir_path, name)
+            if path in kept:
+                dir_names.remove(name)
+            elif path not in ancestors:
+                remove(path)
+                dir_names.remove(name)
+                removed = True
+        for name in file_names:
+            path = os.path.join(dir_path, name)
+            if path not in kept:
+                os.remove(path)
+                removed = True
+    return removed
+
+
+def prune_benchmarks(benchmarks: list[dict]) -> tuple[list[dict], list[dict]]:
+    """
+    Prunes all the benchmarks and checks afterwards that none of the paths read by the pipeline was removed.
+
+    :return: Lists of the benchmarks that were actually pruned and of the benchmarks that are broken by pruning.
+    """
+    roots = sorted({benchmark['root'] for benchmark in benchmarks})
+    size_before = disk_usage(roots)
+
+    used_paths = [[path for path in get_used_paths(benchmark) if os.path.exists(path)] for benchmark in benchmarks]
+    pruned = [benchmark for benchmark in benchmarks if prune_benchmark(benchmark)]
+
+    broken = []
+    for benchmark, paths in zip(benchmarks, used_paths):
+        missing = [path for path in paths if not os.path.exists(path)]
+        if missing:
+            logging.error(f'Benchmark {benchmark["build_id"]} is broken after pruning, '
+                          f'removed: {", ".join(missing)}')
+            broken.append(benchmark)
+
+    size_after = disk_usage(roots)
+    logging.info(f'Pruned {len(pruned)} out of {len(benchmarks)} benchmarks: '
+                 f'{size_before / (1024 * 1024):.1f} MiB -> {size_after / (1024 * 1024):.1f} MiB')
+    return pruned, broken
+
+
+def main():
+    logging.basicConfig(
+        format='[%(asctime)s][%(levelname)s] %(message)s',
+        level=logging.INFO
+    )
+
+    parser = argparse.ArgumentParser(description="Removes everything the pipeline does not use from the benchmarks")
+    parser.add_argument("benchmarks", type=str, help="Path to benchmarks.json")
+    args = parser.parse_args()
+
+    with open(args.benchmarks) as file:
+        benchmarks = json.load(file)
+
+    _, broken = prune_benchmarks(benchmarks)
+    if broken:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
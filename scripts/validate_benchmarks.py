@@ -0,0 +1,107 @@
+#!/bin/python3
+import argparse
+import collections
+import json
+import logging
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+
+def class_file_path(benchmark: dict) -> str:
+    return os.path.join(benchmark['bin'], *benchmark['klass'].split('.')) + '.class'
+
+
+def source_file_paths(benchmark: dict) -> list[str]:
+    base = os.path.join(benchmark['src'], *benchmark['klass'].split('.'))
+    return [base + '.java', base + '.kt']
+
+
+def check_benchmark(benchmark: dict) -> list[str]:
+    """
+    Checks that the benchmark can be used by the pipeline: the class under test is compiled,
+    its source file is readable and all the class path entries exist.
+
+    :return: List of found problems, empty if the benchmark is valid.
+    """
+    problems = []
+    if not os.path.isfile(class_file_path(benchmark)):
+        problems.append(f'class file of {benchmark["klass"]} is not found in {benchmark["bin"]}')
+    if not any(os.path.isfile(path) and os.access(path, os.R_OK) for path in source_file_paths(benchmark)):
+        problems.append(f'readable source file of {benchmark["klass"]} is not found in {benchmark["src"]}')
+    for path in benchmark['classPath']:
+        if not os.path.exists(path):
+            problems.append(f'class path entry {path} does not exist')
+    return problems
+
+
+def validate_benchmarks(benchmarks: list[dict], jobs: int = 1) -> dict[int, list[str]]:
+    """
+    Checks all the benchmarks in parallel, including the uniqueness of their build ids.
+
+    :return: Problems of the invalid benchmarks, indexed by their position in `benchmarks`.
+    """
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        problems = list(executor.map(check_benchmark, benchmarks))
+
+    # there is no way to tell which of the duplicates is the right one, so all of them are invalid
+    build_ids = collections.Counter(benchmark['build_id'] for benchmark in benchmarks)
+    for index, benchmark in enumerate(benchmarks):
+        count = build_ids[benchmark['build_id']]
+        if count > 1:
+            problems[index].append(f'build id {benchmark["build_id"]} is used by {count} benchmarks')
+
+    return {index: benchmark_problems for index, benchmark_problems in enumerate(problems) if benchmark_problems}
+
+
+def make_report(benchmarks: list[dict], invalid: dict[int, list[str]]) -> dict:
+    return {
+        'total': len(benchmarks),
+        'valid': len(benchmarks) - len(invalid),
+        'invalid': [
+            {
+                'build_id': benchmarks[index]['build_id'],
+                'klass': benchmarks[index]['klass'],
+                'problems': problems,
+            }
+            for index, problems in sorted(invalid.items())
+        ],
+    }
+
+
+def main():
+    logging.basicConfig(
+        format='[%(asctime)s][%(levelname)s] %(message)s',
+        level=logging.INFO
+    )
+
+    parser = argparse.ArgumentParser(description="Checks that all the benchmarks can be used by the pipeline")
+    parser.add_argument("benchmarks", type=str, help="Path to benchmarks.json")
+    parser.add_argument("--jobs", type=int, default=os.cpu_count(), help="Number of parallel checks")
+    parser.add_argument("--report", type=str, help="Path to write the JSON report to")
+    parser.add_argument("--output", type=str, help="Path to write the list of valid benchmarks to")
+    args = parser.parse_args()
+
+    with open(args.benchmarks) as file:
+        benchmarks = json.load(file)
+
+    invalid = validate_benchmarks(benchmarks, args.jobs)
+    for index, problems in sorted(invalid.items()):
+        logging.error(f'Benchmark {benchmarks[index]["build_id"]} is invalid: {"; ".join(problems)}')
+    logging.info(f'{len(benchmarks) - len(invalid)} out of {len(benchmarks)} benchmarks are valid')
+
+    if args.report is not None:
+        with open(args.report, 'w') as file:
+            file.write(json.dumps(make_report(benchmarks, invalid), indent=2))
+
+    if args.output is not None:
+        with open(args.output, 'w') as file:
+            valid = [benchmark for index, benchmark in enumerate(benchmarks) if index not in invalid]
+            file.write(json.dumps(valid, indent=2))
+
+    if invalid:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import math
+import os
+
+from generate_compose import Tool
+
+# approximate resources used by a single runner/tool pair of each tool: cores and memory in MiB
+TOOL_PROFILES = {
+    Tool.kex: (2, 6144),
+    Tool.EvoSuite: (2, 4096),
+    Tool.TestSpark: (2, 8192),
+    Tool.Jazzer: (1, 4096),
+    Tool.Manual: (1, 1024),
+}
+# memory used by the runner container of each worker, in MiB
+RUNNER_MEMORY = 512
+# memory left for the host itself, in MiB
+RESERVED_MEMORY = 2048
+# time spent on each benchmark in addition to the generation timeout: tool startup, test suite collection etc.
+BENCHMARK_OVERHEAD = 30
+
+CGROUP_ROOT = '/sys/fs/cgroup'
+
+
+def _read_first_line(path: str) -> str:
+    try:
+        with open(path) as file:
+            return file.readline().strip()
+    except OSError:
+        return None
+
+
+def _read_cgroup_file(controller: str, name: str) -> str:
+    """
+    Reads a cgroup v1 file of `controller` (or cgroup v2 file, if `controller` is None) for the current process.
+    """
+    try:
+        with open('/proc/self/cgroup') as file:
+            lines = file.read().splitlines()
+    except OSError:
+        return None
+
+    for line in lines:
+        _, controllers, path = line.split(':', 2)
+        if controller is None and controllers != '':
+            continue
+        if controller is not None and controller not in controllers.split(','):
+            continue
+        base_dir = CGROUP_ROOT if controller is None else os.path.join(CGROUP_ROOT, controller)
+        # inside a container the cgroup of the process is usually mounted as the root
+        for cgroup_dir in (os.path.join(base_dir, path.lstrip('/')), base_dir):
+            value = _read_first_line(os.path.join(cgroup_dir, name))
+            if value is not None:
+                return value
+    return None
+
+
+def get_available_cores() -> float:
+    """
+    Number of cores available to this process, taking the CPU affinity and the cgroup CPU quota into account.
+    """
+    cores = len(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else os.cpu_count()
+
+    quota = None
+    cpu_max = _read_cgroup_file(None, 'cpu.max')
+    if cpu_max is not None:
+        limit, period = cpu_max.split()
+        if limit != 'max':
+            quota = int(limit) / int(period)
+    else:
+        limit = _read_cgroup_file('cpu', 'cpu.cfs_quota_us')
+        period = _read_cgroup_file('cpu', 'cpu.cfs_period_us')
+        if limit is not None and period is not None and int(limit) > 0:
+            quota = int(limit) / int(period)
+
+    return min(cores, quota) if quota is not None else cores
+
+
+def get_available_memory() -> int:
+    """
+    Memory available to this process in MiB, taking the cgroup memory limit into account.
+    """
+    available = None
+    with open('/proc/meminfo') as file:
+        for line in file:
+            if line.startswith('MemAvailable:'):
+                available = int(line.split()[1]) // 1024
+
+    limit = _read_cgroup_file(None, 'memory.max')
+    if limit is None:
+        limit = _read_cgroup_file('memory', 'memory.limit_in_bytes')
+    # cgroup v1 reports "no limit" as a huge number, so it is handled by `min` as well
+    if limit is not None and limit != 'max':
+        limit_mib = int(limit) // (1024 * 1024)
+        available = limit_mib if available is None else min(available, limit_mib)
+    return available
+
+
+def choose_workers(tool: Tool, cpus_per_worker: int = None, memory_per_worker: int = None) -> int:
+    """
+    Largest number of workers that fit into the available cores and memory, according to the tool profile
+    or the explicitly set per-worker resources.
+    """
+    profile_cores, profile_memory = TOOL_PROFILES[tool]
+    cores = cpus_per_worker if cpus_per_worker is not None else profile_cores
+    memory = (memory_per_worker if memory_per_worker is not None else profile_memory) + RUNNER_MEMORY
+
+    by_cores = math.floor(get_available_cores() / cores)
+    by_memory = (get_available_memory() - RESERVED_MEMORY) // memory
+    return max(1, min(by_cores, by_memory))
+
+
+def expected_throughput(workers: int, timeout: int) -> float:
+    """
+    Lower bound of the number of benchmarks processed per hour, assuming that every generation takes the whole timeout.
+    """
+    return workers * 3600 / (timeout + BENCHMARK_OVERHEAD)
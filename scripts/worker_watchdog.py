@@ -0,0 +1,151 @@
+import json
+import os
+import time
+from typing import Optional
+
+from planning import CLAIMED_DIR
+from planning import DONE_DIR
+from planning import Job
+from planning import get_queue_dir
+from planning import get_result_dir
+
+# time given to a worker on top of the generation timeout before it is considered hung
+DEFAULT_GRACE = 5 * 60
+# a worker that hangs this many times is stopped instead of being restarted again
+MAX_RESTARTS = 3
+
+
+def get_heartbeat_dir(results_path: str, name: str) -> str:
+    return os.path.join(results_path, f'heartbeat-{name}')
+
+
+def get_incidents_file(results_path: str, name: str) -> str:
+    return os.path.join(results_path, f'incidents-{name}.jsonl')
+
+
+class Watchdog:
+    """
+    Detects hung workers by their heartbeat files: each runner rewrites its file in `heartbeat_dir` whenever it starts
+    a job (see `--heartbeat` option of tga-runner), and a job is never given more than the timeout. A worker that
+    has neither started a job nor been (re)started for `timeout + grace` seconds is hung: its tool is deadlocked,
+    the connection is broken, or the tool has never connected.
+    Before a hung worker is restarted, the job it is hung on is skipped (see `skip_hung_job`),
+    so the restarted runner continues with the next unfinished job.
+    Incidents are appended to `incidents-<name>.jsonl` in `results_path` as JSON lines.
+    """
+
+    def __init__(self, results_path: str, name: str, timeout: int, grace: int = DEFAULT_GRACE):
+        self.results_path = results_path
+        self.heartbeat_dir = get_heartbeat_dir(results_path, name)
+        self.incidents_file = get_incidents_file(results_path, name)
+        self.deadline = timeout + grace
+        self.start_times = {}
+        self.restarts = {}
+        self.experiments = {}
+        os.makedirs(self.heartbeat_dir, exist_ok=True)
+        # the runners write the heartbeats as the container user
+        os.chmod(self.heartbeat_dir, 0o777)
+
+    def add_worker(self, worker: str, tool_name: str, run_name: str) -> None:
+        """
+        Registers the tool and the run name of `worker`, so its results can be found.
+        """
+        self.experiments[worker] = (tool_name, run_name)
+
+    def get_heartbeat_file(self, worker: str) -> str:
+        return os.path.join(self.heartbeat_dir, worker)
+
+    def _read_heartbeat(self, worker: str) -> tuple[Optional[float], Optional[Job]]:
+        path = self.get_heartbeat_file(worker)
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path) as file:
+                parts = file.read().split()
+        except FileNotFoundError:
+            return None, None
+        job = Job(int(parts[0]), parts[1]) if len(parts) == 2 and parts[0].isdigit() else None
+        return mtime, job
+
+    def mark_started(self, worker: str) -> None:
+        self.start_times[worker] = time.time()
+
+    def is_hung(self, worker: str, now: float = None) -> bool:
+        now = now if now is not None else time.time()
+        heartbeat, _ = self._read_heartbeat(worker)
+        last_activity = max(self.start_times.get(worker, now), heartbeat or 0)
+        return now - last_activity > self.deadline
+
+    def can_restart(self, worker: str) -> bool:
+        return self.restarts.get(worker, 0) < MAX_RESTARTS
+
+    def skip_hung_job(self, worker: str) -> Optional[Job]:
+        """
+        Marks the job from the heartbeat of a hung `worker` as done, so it is not picked up again: creates its result
+        folder, which the runner skips (the result stays incomplete, so `--resume` retries it later), and moves
+        the job file of the job queue from `claimed` to `done`.
+
+        :return: The skipped job, or None if the worker has not started any job or is not registered.
+        """
+        _, job = self._read_heartbeat(worker)
+        if job is None or worker not in self.experiments:
+            return None
+        tool_name, run_name = self.experiments[worker]
+
+        result_dir = get_result_dir(self.results_path, tool_name, run_name, job)
+        missing_dirs = []
+        path = result_dir
+        while not os.path.exists(path):
+            missing_dirs.append(path)
+            path = os.path.dirname(path)
+        for path in reversed(missing_dirs):
+            os.mkdir(path)
+            # the runners write into these folders as the container user
+            os.chmod(path, 0o777)
+
+        queue_dir = get_queue_dir(self.results_path, run_name)
+        claimed_dir = os.path.join(queue_dir, CLAIMED_DIR)
+        if os.path.isdir(claimed_dir):
+            for name in os.listdir(claimed_dir):
+                try:
+                    with open(os.path.join(claimed_dir, name)) as file:
+                        parts = file.read().split()
+                except FileNotFoundError:
+                    continue
+                if parts == [str(job.run), job.build_id]:
+                    os.replace(os.path.join(claimed_dir, name), os.path.join(queue_dir, DONE_DIR, name))
+        return job
+
+    def record(self, worker: str, action: str, skipped: bool = False) -> None:
+        """
+        Records an incident of a hung `worker`, `action` is either `restarted` or `stopped`,
+        `skipped` tells whether the job it is hung on was skipped.
+        """
+        now = time.time()
+        heartbeat, job = self._read_heartbeat(worker)
+        if action == 'restarted':
+            self.restarts[worker] = self.restarts.get(worker, 0) + 1
+        incident = {
+            'time': now,
+            'worker': worker,
+            'run': job.run if job is not None else None,
+            'build_id': job.build_id if job is not None else None,
+            'idle': now - max(self.start_times.get(worker, now), heartbeat or 0),
+            'action': action,
+            'skipped': skipped,
+            'restarts': self.restarts.get(worker, 0),
+        }
+        with open(self.incidents_file, 'a') as file:
+            file.write(json.dumps(incident) + '\n')
+        hung_on = f'job {job.run} {job.build_id}{" (skipped)" if skipped else ""}' if job is not None else 'start'
+        print(f'{worker} is hung on {hung_on}, {action}')
+
+    def handle_hung(self, worker: str) -> bool:
+        """
+        Skips the job of a hung `worker` and records the incident.
+
+        :return: True if the worker should be restarted, False if it hangs too often and should be stopped.
+        """
+        skipped = self.skip_hung_job(worker) is not None
+        restart = self.can_restart(worker)
+        self.record(worker, 'restarted' if restart else 'stopped', skipped)
+        return restart
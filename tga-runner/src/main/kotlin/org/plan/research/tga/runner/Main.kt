@@ -1,8 +1,13 @@
 package org.plan.research.tga.runner
 
+import org.plan.research.tga.core.benchmark.json.JsonBenchmarkProvider
 import org.plan.research.tga.runner.config.TgaRunnerConfig
+import org.plan.research.tga.runner.job.PlanJobProvider
+import org.plan.research.tga.runner.job.QueueJobProvider
+import org.plan.research.tga.runner.job.RunRangeJobProvider
 import org.vorpal.research.kthelper.logging.log
 import java.nio.file.Paths
+import kotlin.io.path.exists
 import kotlin.system.exitProcess
 import kotlin.time.DurationUnit
 import kotlin.time.toDuration
@@ -16,28 +21,60 @@ fun main(args: Array<String>) {
     val outputDirectory = Paths.get(config.getCmdValue("output")!!)
 
     val baseRunName = config.getCmdValue("runName", "run")
-    val runIds = try {
-        config.getCmdValue("runs")!!.let { str ->
-            when {
-                ".." in str -> {
-                    val nums = str.split("..")
-                    IntRange(nums[0].toInt(), nums[1].toInt())
-                }
+    val benchmarkProvider = JsonBenchmarkProvider(benchmarks)
 
-                else -> IntRange(str.toInt(), str.toInt())
-            }
-        }
-    } catch (e: NumberFormatException) {
-        log.error("Could not parse run command line argument, ", e)
+    val runs = config.getCmdValue("runs")
+    val queue = config.getCmdValue("queue")
+    val plan = config.getCmdValue("plan")
+    if (listOfNotNull(runs, queue, plan).size != 1) {
+        log.error("Exactly one of runs, queue and plan should be specified")
         config.printHelp()
         exitProcess(1)
     }
-    if (runIds.isEmpty()) {
-        log.error("Run ids interval cannot be empty")
-        config.printHelp()
-        exitProcess(1)
+
+    val jobProvider = when {
+        queue != null -> {
+            val queueDirectory = Paths.get(queue)
+            if (!queueDirectory.resolve(QueueJobProvider.PENDING).exists()) {
+                log.error("Queue directory $queueDirectory does not contain pending jobs")
+                exitProcess(1)
+            }
+            QueueJobProvider(queueDirectory)
+        }
+
+        plan != null -> PlanJobProvider(Paths.get(plan))
+
+        else -> {
+            val runIds = try {
+                runs!!.let { str ->
+                    when {
+                        ".." in str -> {
+                            val nums = str.split("..")
+                            IntRange(nums[0].toInt(), nums[1].toInt())
+                        }
+
+                        else -> IntRange(str.toInt(), str.toInt())
+                    }
+                }
+            } catch (e: NumberFormatException) {
+                log.error("Could not parse run command line argument, ", e)
+                config.printHelp()
+                exitProcess(1)
+            }
+            if (runIds.isEmpty()) {
+                log.error("Run ids interval cannot be empty")
+                config.printHelp()
+                exitProcess(1)
+            }
+            RunRangeJobProvider(runIds, benchmarkProvider.benchmarks().map { it.buildId })
+        }
     }
 
-    val runner = TgaRunner(port, benchmarks, timeLimit, outputDirectory, baseRunName, runIds)
+    val heartbeatFile = config.getCmdValue("heartbeat")?.let { Paths.get(it) }
+    val portFile = config.getCmdValue("portFile")?.let { Paths.get(it) }
+
+    val runner = TgaRunner(
+        port, benchmarkProvider, jobProvider, timeLimit, outputDirectory, baseRunName, heartbeatFile, portFile
+    )
     runner.run()
 }
@@ -1,16 +1,21 @@
 package org.plan.research.tga.runner
 
 import kotlinx.serialization.encodeToString
-import org.plan.research.tga.core.benchmark.json.JsonBenchmarkProvider
+import org.plan.research.tga.core.benchmark.Benchmark
+import org.plan.research.tga.core.benchmark.BenchmarkProvider
 import org.plan.research.tga.core.benchmark.json.getJsonSerializer
 import org.plan.research.tga.core.tool.protocol.BenchmarkRequest
 import org.plan.research.tga.core.tool.protocol.StopRequest
 import org.plan.research.tga.core.tool.protocol.SuccessfulGenerationResult
+import org.plan.research.tga.core.tool.protocol.Tga2ToolConnection
 import org.plan.research.tga.core.tool.protocol.UnsuccessfulGenerationResult
+import org.plan.research.tga.runner.job.Job
+import org.plan.research.tga.runner.job.JobProvider
 import org.plan.research.tga.runner.tool.protocol.tcp.TcpTgaServer
 import org.vorpal.research.kthelper.logging.log
 import java.nio.file.Files
 import java.nio.file.Path
+import java.nio.file.StandardCopyOption
 import kotlin.io.path.createDirectories
 import kotlin.io.path.exists
 import kotlin.io.path.writeText
@@ -18,18 +23,21 @@ import kotlin.time.Duration
 
 class TgaRunner(
     private val serverPort: UInt,
-    private val configFile: Path,
+    private val benchmarkProvider: BenchmarkProvider,
+    private val jobProvider: JobProvider,
     private val timeLimit: Duration,
     private val outputDirectory: Path,
     private val baseRunName: String,
-    private val runIds: IntRange,
+    private val heartbeatFile: Path? = null,
+    private val portFile: Path? = null,
 ) {
     private val json = getJsonSerializer(pretty = false)
 
     fun run() {
-        val benchmarkProvider = JsonBenchmarkProvider(configFile)
+        val benchmarks = benchmarkProvider.benchmarks().associateBy { it.buildId }
         val server = TcpTgaServer(serverPort)
-        log.debug("Started server, awaiting for tool connection")
+        writePort(server.localPort)
+        log.debug("Started server on port ${server.localPort}, awaiting for tool connection")
 
         server.accept().use { toolConnection ->
             log.debug("Tool connected")
@@ -39,49 +47,16 @@ class TgaRunner(
 
             val baseDir = outputDirectory.resolve(name)
 
-            for (run in runIds) {
-                val runDir = baseDir.resolve("$baseRunName-$run")
-                for (benchmark in benchmarkProvider.benchmarks()) {
-                    log.debug("Running on benchmark ${benchmark.buildId}")
-
-                    val benchmarkOutput = runDir.resolve(benchmark.buildId)
-
-                    if (benchmarkOutput.exists()) {
-                        log.debug("Benchmark {} already run, skipping", benchmark)
-                        continue
-                    }
-
-                    toolConnection.send(BenchmarkRequest(benchmark, timeLimit, benchmarkOutput))
-                    log.debug("Sent benchmark to tool")
-
-                    val result = toolConnection.receive()
-                    log.debug("Received an answer from tool")
-                    log.debug("Generation time is ${result.generationTime}")
-                    if (result is UnsuccessfulGenerationResult) {
-                        log.error("Unsuccessful run on benchmark ${benchmark.buildId}: $result")
-                        continue
-                    }
-                    val testSuite = (result as SuccessfulGenerationResult).testSuite
-
-                    if (!benchmarkOutput.exists()) {
-                        log.error("Tool $name did not produce a test suite for ${benchmark.buildId} during run $run")
-                        continue
-                    }
-
-                    benchmarkOutput.resolve("benchmark.json").also {
-                        it.parent.toFile().mkdirs()
-                        it.writeText(json.encodeToString(benchmark))
-                    }
-                    benchmarkOutput.resolve("testSuite.json").also {
-                        it.parent.toFile().mkdirs()
-                        it.writeText(json.encodeToString(testSuite))
-                    }
-
-                    Files.walk(benchmarkOutput).forEach {
-                        it.toFile().setReadable(true, false)
-                        it.toFile().setWritable(true, false)
-                    }
+            while (true) {
+                val job = jobProvider.next() ?: break
+                heartbeat(job)
+                val benchmark = benchmarks[job.buildId]
+                if (benchmark == null) {
+                    log.error("Unknown benchmark ${job.buildId} in job $job")
+                } else {
+                    runBenchmark(toolConnection, name, baseDir.resolve("$baseRunName-${job.run}"), job.run, benchmark)
                 }
+                jobProvider.complete(job)
             }
 
             toolConnection.send(StopRequest)
@@ -92,4 +67,69 @@ class TgaRunner(
             it.toFile().setWritable(true, false)
         }
     }
+
+    private fun writePort(port: Int) {
+        val file = portFile ?: return
+        file.parent?.createDirectories()
+        // the port is read by another process, so the file is never seen half-written
+        val tmpFile = file.resolveSibling("${file.fileName}.tmp")
+        tmpFile.writeText("$port")
+        Files.move(tmpFile, file, StandardCopyOption.ATOMIC_MOVE)
+    }
+
+    private fun heartbeat(job: Job) {
+        val file = heartbeatFile ?: return
+        file.parent?.createDirectories()
+        file.writeText("${job.run} ${job.buildId}")
+        file.toFile().setReadable(true, false)
+        file.toFile().setWritable(true, false)
+    }
+
+    private fun runBenchmark(
+        toolConnection: Tga2ToolConnection,
+        name: String,
+        runDir: Path,
+        run: Int,
+        benchmark: Benchmark,
+    ) {
+        log.debug("Running on benchmark ${benchmark.buildId}")
+
+        val benchmarkOutput = runDir.resolve(benchmark.buildId)
+
+        if (benchmarkOutput.exists()) {
+            log.debug("Benchmark {} already run, skipping", benchmark)
+            return
+        }
+
+        toolConnection.send(BenchmarkRequest(benchmark, timeLimit, benchmarkOutput))
+        log.debug("Sent benchmark to tool")
+
+        val result = toolConnection.receive()
+        log.debug("Received an answer from tool")
+        log.debug("Generation time is ${result.generationTime}")
+        if (result is UnsuccessfulGenerationResult) {
+            log.error("Unsuccessful run on benchmark ${benchmark.buildId}: $result")
+            return
+        }
+        val testSuite = (result as SuccessfulGenerationResult).testSuite
+
+        if (!benchmarkOutput.exists()) {
+            log.error("Tool $name did not produce a test suite for ${benchmark.buildId} during run $run")
+            return
+        }
+
+        benchmarkOutput.resolve("benchmark.json").also {
+            it.parent.toFile().mkdirs()
+            it.writeText(json.encodeToString(benchmark))
+        }
+        benchmarkOutput.resolve("testSuite.json").also {
+            it.parent.toFile().mkdirs()
+            it.writeText(json.encodeToString(testSuite))
+        }
+
+        Files.walk(benchmarkOutput).forEach {
+            it.toFile().setReadable(true, false)
+            it.toFile().setWritable(true, false)
+        }
+    }
 }
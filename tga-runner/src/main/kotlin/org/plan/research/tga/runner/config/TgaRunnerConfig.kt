@@ -15,10 +15,16 @@ class TgaRunnerConfig(args: Array<String>) : TgaConfig("tga-runner", options, ar
             )
 
             addOption(
-                Option("p", "port", true, "server port to run on")
+                Option("p", "port", true, "server port to run on, 0 to choose any free port")
                     .also { it.isRequired = true }
             )
 
+            addOption(
+                Option(null, "portFile", true, "file to write the port the server listens on to," +
+                        " used with port 0 to pass the chosen port to the tool")
+                    .also { it.isRequired = false }
+            )
+
             addOption(
                 Option("c", "config", true, "configuration file")
                     .also { it.isRequired = true }
@@ -42,8 +48,27 @@ class TgaRunnerConfig(args: Array<String>) : TgaConfig("tga-runner", options, ar
             addOption(
                 Option(null, "runs", true, "number of runs," +
                         " just *n* for a single run with id *n*" +
-                        " or an int range in format *n..m* for *m - n* runs with ids from n to m")
-                    .also { it.isRequired = true }
+                        " or an int range in format *n..m* for *m - n* runs with ids from n to m," +
+                        " exactly one of runs, queue and plan should be specified")
+                    .also { it.isRequired = false }
+            )
+
+            addOption(
+                Option(null, "queue", true, "job queue directory shared by several runners," +
+                        " exactly one of runs, queue and plan should be specified")
+                    .also { it.isRequired = false }
+            )
+
+            addOption(
+                Option(null, "plan", true, "file with the jobs to execute, one \"run buildId\" pair per line," +
+                        " exactly one of runs, queue and plan should be specified")
+                    .also { it.isRequired = false }
+            )
+
+            addOption(
+                Option(null, "heartbeat", true, "file that is rewritten with the current \"run buildId\" job" +
+                        " every time a job is started, used to detect hung workers")
+                    .also { it.isRequired = false }
             )
         }
     }
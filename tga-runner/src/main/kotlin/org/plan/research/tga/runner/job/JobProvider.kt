@@ -0,0 +1,15 @@
+package org.plan.research.tga.runner.job
+
+data class Job(val run: Int, val buildId: String)
+
+interface JobProvider {
+    /**
+     * @return next job to execute or `null` if there are no jobs left
+     */
+    fun next(): Job?
+
+    /**
+     * Marks the job as finished, regardless of whether the tool was successful on it or not
+     */
+    fun complete(job: Job)
+}
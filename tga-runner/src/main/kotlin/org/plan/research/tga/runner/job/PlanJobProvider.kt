@@ -0,0 +1,23 @@
+package org.plan.research.tga.runner.job
+
+import org.vorpal.research.kthelper.logging.log
+import java.nio.file.Path
+import kotlin.io.path.readLines
+
+/**
+ * Fixed list of jobs from a plan file with "run buildId" lines, e.g. produced by the resume planner
+ */
+class PlanJobProvider(planFile: Path) : JobProvider {
+    private val jobs = planFile.readLines()
+        .filter { it.isNotBlank() }
+        .mapNotNull { line ->
+            QueueJobProvider.parseJob(line).also {
+                if (it == null) log.error("Could not parse job \"$line\" in plan file $planFile")
+            }
+        }
+        .iterator()
+
+    override fun next(): Job? = if (jobs.hasNext()) jobs.next() else null
+
+    override fun complete(job: Job) {}
+}
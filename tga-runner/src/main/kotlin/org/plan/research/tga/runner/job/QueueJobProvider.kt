@@ -0,0 +1,71 @@
+package org.plan.research.tga.runner.job
+
+import org.vorpal.research.kthelper.logging.log
+import java.nio.file.Files
+import java.nio.file.NoSuchFileException
+import java.nio.file.Path
+import java.nio.file.StandardCopyOption
+import kotlin.io.path.createDirectories
+import kotlin.io.path.listDirectoryEntries
+import kotlin.io.path.readText
+
+/**
+ * Lock-free job queue shared by several runners through a directory, e.g. on the results volume.
+ * Each job is a file in `pending` directory containing "run buildId" line. A runner claims a job
+ * by atomically moving its file into `claimed` directory, so every job is executed only by one runner,
+ * and moves it into `done` directory once it is finished. Jobs are claimed in the order of file names.
+ * Jobs that are left in `claimed` directory by a crashed runner are returned to the queue
+ * by the planner (`scripts/planning.py`) on the next launch.
+ */
+class QueueJobProvider(queueDirectory: Path) : JobProvider {
+    companion object {
+        const val PENDING = "pending"
+        const val CLAIMED = "claimed"
+        const val DONE = "done"
+
+        fun parseJob(line: String): Job? {
+            val parts = line.trim().split(' ')
+            if (parts.size != 2) return null
+            val run = parts[0].toIntOrNull() ?: return null
+            return Job(run, parts[1])
+        }
+    }
+
+    private val pendingDirectory = queueDirectory.resolve(PENDING)
+    private val claimedDirectory = queueDirectory.resolve(CLAIMED).also { it.createDirectories() }
+    private val doneDirectory = queueDirectory.resolve(DONE).also { it.createDirectories() }
+
+    private val candidates = ArrayDeque<Path>()
+    private val claimedFiles = mutableMapOf<Job, Path>()
+
+    override fun next(): Job? {
+        while (true) {
+            if (candidates.isEmpty()) {
+                candidates.addAll(pendingDirectory.listDirectoryEntries().sortedBy { it.fileName.toString() })
+                if (candidates.isEmpty()) return null
+            }
+
+            val pendingFile = candidates.removeFirst()
+            val claimedFile = claimedDirectory.resolve(pendingFile.fileName)
+            try {
+                Files.move(pendingFile, claimedFile, StandardCopyOption.ATOMIC_MOVE)
+            } catch (e: NoSuchFileException) {
+                // job was claimed by another runner
+                continue
+            }
+
+            val job = parseJob(claimedFile.readText())
+            if (job == null) {
+                log.error("Could not parse job file $claimedFile")
+                continue
+            }
+            claimedFiles[job] = claimedFile
+            return job
+        }
+    }
+
+    override fun complete(job: Job) {
+        val claimedFile = claimedFiles.remove(job) ?: return
+        Files.move(claimedFile, doneDirectory.resolve(claimedFile.fileName), StandardCopyOption.ATOMIC_MOVE)
+    }
+}
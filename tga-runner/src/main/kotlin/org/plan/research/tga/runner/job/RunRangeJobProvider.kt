@@ -0,0 +1,15 @@
+package org.plan.research.tga.runner.job
+
+/**
+ * Static schedule: all the benchmarks for each of the runs, in the order of the benchmarks file
+ */
+class RunRangeJobProvider(
+    runIds: IntRange,
+    buildIds: List<String>,
+) : JobProvider {
+    private val jobs = runIds.asSequence().flatMap { run -> buildIds.map { Job(run, it) } }.iterator()
+
+    override fun next(): Job? = if (jobs.hasNext()) jobs.next() else null
+
+    override fun complete(job: Job) {}
+}
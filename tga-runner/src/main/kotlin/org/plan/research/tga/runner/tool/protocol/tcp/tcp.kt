@@ -15,6 +15,8 @@ class TcpTgaServer(
 ) : TgaServer {
     private val serverSocket = ServerSocket(port.toInt())
 
+    val localPort: Int get() = serverSocket.localPort
+
     override fun accept(): Tga2ToolConnection {
         val socket = serverSocket.accept()
         return TcpTga2ToolConnection(socket)